@@ -0,0 +1,152 @@
+"""
+Token authentication that serves warm requests from the cache alone.
+
+DRF's TokenAuthentication runs a `Token JOIN CustomUser` query on every
+request. CachedTokenAuthentication remembers which user a token belongs to in
+a bounded in-process LRU (TOKEN_CACHE_LOCAL_TTL /
+TOKEN_CACHE_LOCAL_MAX_ENTRIES) backed by the shared Django cache
+(TOKEN_CACHE_TTL), and keeps the user's USER_FIELDS in the shared cache,
+stamped with a per-user version. A warm request builds the user from those
+fields without touching the database; every other field is deferred and
+loaded on first access, so counters are never served stale.
+
+accounts.signals bumps the version whenever a user is saved or deleted, which
+covers deactivation (deletion.schedule) and password changes, and drops the
+token entry when a token is deleted. Writes made with update() send no
+signal and are only seen once the entry expires. Another worker's in-process
+token copy may outlive a deleted token by up to TOKEN_CACHE_LOCAL_TTL seconds.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.base import DEFERRED
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+# Fields cached to build request.user; the password hash is never cached
+USER_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+
+_local = OrderedDict()
+_lock = threading.Lock()
+
+
+def _key(token_key):
+    # Never use the raw credential as a cache key
+    return 'accounts:token:' + hashlib.sha256(token_key.encode()).hexdigest()
+
+
+def _user_key(user_id):
+    return f'accounts:user:{user_id}'
+
+
+def _version_key(user_id):
+    return f'accounts:user:{user_id}:version'
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+def expire_user(user_id):
+    """
+    Mark the cached fields of `user_id` as stale. Bumps now and again on
+    commit, so a request that reads the row before the write commits can't
+    cache it under the new version.
+    """
+    key = _version_key(user_id)
+    _bump(key)
+    transaction.on_commit(partial(_bump, key))
+
+
+def _version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Never restart at a value an older entry may still carry
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _build(fields):
+    model = get_user_model()
+    concrete = model._meta.concrete_fields
+    values = [fields.get(field.attname, DEFERRED) for field in concrete]
+    return model.from_db(model._default_manager.db, [field.attname for field in concrete], values)
+
+
+def _load_user(user_id):
+    """User `user_id` (or None), built from the cache when its entry is current."""
+    keys = [_version_key(user_id), _user_key(user_id)]
+    values = cache.get_many(keys)
+    version, entry = values.get(keys[0]), values.get(keys[1])
+    if version is not None and entry is not None and entry[0] == version:
+        return _build(entry[1])
+
+    # Read the version before the row, so a save landing in between leaves
+    # this entry stale instead of caching the old row under the new version
+    if version is None:
+        version = _version(user_id)
+    user = get_user_model()._default_manager.filter(pk=user_id).first()
+    if user is not None:
+        fields = {name: getattr(user, name) for name in USER_FIELDS}
+        cache.set(keys[1], (version, fields), settings.TOKEN_CACHE_TTL)
+    return user
+
+
+def invalidate(*token_keys):
+    keys = [_key(token_key) for token_key in token_keys]
+    cache.delete_many(keys)
+    with _lock:
+        for key in keys:
+            _local.pop(key, None)
+
+
+def _remember(key, user_id):
+    with _lock:
+        _local[key] = (time.monotonic() + settings.TOKEN_CACHE_LOCAL_TTL, user_id)
+        _local.move_to_end(key)
+        while len(_local) > settings.TOKEN_CACHE_LOCAL_MAX_ENTRIES:
+            _local.popitem(last=False)
+
+
+def _lookup(key):
+    with _lock:
+        entry = _local.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                _local.move_to_end(key)
+                return entry[1]
+            del _local[key]
+
+    user_id = cache.get(key)
+    if user_id is not None:
+        _remember(key, user_id)
+    return user_id
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cache_key = _key(key)
+        user_id = _lookup(cache_key)
+        if user_id is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, user.pk, settings.TOKEN_CACHE_TTL)
+            _remember(cache_key, user.pk)
+            return (user, token)
+
+        user = _load_user(user_id)
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (user, self.get_model()(key=key, user=user))
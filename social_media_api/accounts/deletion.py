@@ -0,0 +1,180 @@
+"""
+Asynchronous account deletion.
+
+Deleting a CustomUser directly makes Django's collector load every dependent
+post, comment, like, notification and follow edge into memory and delete
+them in one long transaction. Instead, `schedule()` only deactivates the
+account, revokes its tokens and records an AccountDeletion. The
+purge_deleted_accounts worker then calls `purge()`, which walks STAGES in
+order and deletes each table's rows in primary-key batches of at most
+`batch_size`, one short transaction per batch.
+
+Children are purged before their parents (likes and comments on the user's
+posts before the posts, for instance), so no batch cascades into an
+unbounded number of rows. Each batch also repairs what the rows fed into:
+the like/comment counters of other users' posts, follower/following
+counters, the follow graph cache and unread badges. The stage and cursor
+are saved with every batch, so a purge resumes where it stopped.
+
+Deactivating the account hides its posts right away (Post.objects.visible()),
+so they don't linger publicly while the stages before `posts` run.
+"""
+import time
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from notifications import outbox, unread
+from notifications.models import Notification, NotificationActor, NotificationArchive, NotificationEvent
+from posts import response_cache
+from posts.models import Comment, Like, Post, TimelineEntry
+from . import graph
+from .models import AccountDeletion, CustomUser, Follow, FollowSuggestion, ThumbnailJob
+
+
+def _decrement(model, field, ids):
+    """Subtract from `field` of each row in `ids` the number of times it occurs there."""
+    by_amount = defaultdict(list)
+    for pk, amount in Counter(ids).items():
+        by_amount[amount].append(pk)
+    for amount, pks in by_amount.items():
+        model.objects.filter(pk__in=pks).update(**{field: Greatest(F(field) - amount, 0)})
+
+
+def _unlike(user_id, rows):
+    _decrement(Post, 'like_count', [row['post_id'] for row in rows])
+
+
+def _uncomment(user_id, rows):
+    _decrement(Post, 'comment_count', [row['post_id'] for row in rows])
+
+
+def _unfollow_followees(user_id, rows):
+    followee_ids = [row['from_customuser_id'] for row in rows]
+    _decrement(CustomUser, 'follower_count', followee_ids)
+    transaction.on_commit(lambda: graph.invalidate(user_id, followee_ids))
+
+
+def _drop_followers(user_id, rows):
+    follower_ids = [row['to_customuser_id'] for row in rows]
+    _decrement(CustomUser, 'following_count', follower_ids)
+
+    def invalidate():
+        for follower_id in follower_ids:
+            graph.invalidate(follower_id, [user_id])
+    transaction.on_commit(invalidate)
+
+
+def _forget_unread(user_id, rows):
+    recipient_ids = {row['recipient_id'] for row in rows if not row['read']}
+
+    def clear():
+        for recipient_id in recipient_ids:
+            unread.clear(recipient_id)
+    transaction.on_commit(clear)
+
+
+def _retract_actor(user_id, rows):
+    emptied = outbox.refresh({row['notification_id'] for row in rows})
+
+    def clear():
+        for recipient_id in set(emptied.values()):
+            unread.clear(recipient_id)
+    transaction.on_commit(clear)
+
+
+# (name, model, lookup matching the user's rows, fields the hook needs, hook)
+STAGES = [
+    ('thumbnail_jobs', ThumbnailJob, 'user_id', [], None),
+    ('likes', Like, 'user_id', ['post_id'], _unlike),
+    ('comments', Comment, 'author_id', ['post_id'], _uncomment),
+    ('post_likes', Like, 'post__author_id', [], None),
+    ('post_comments', Comment, 'post__author_id', [], None),
+    ('timeline_entries', TimelineEntry, 'author_id', [], None),
+    ('timeline', TimelineEntry, 'owner_id', [], None),
+    ('posts', Post, 'author_id', [], None),
+    ('notification_actors_received', NotificationActor, 'notification__recipient_id', [], None),
+    ('notifications', Notification, 'recipient_id', [], None),
+    ('notification_actors', NotificationActor, 'actor_id', ['notification_id'], _retract_actor),
+    ('notifications_sent', Notification, 'actor_id', ['recipient_id', 'read'], _forget_unread),
+    ('notification_events', NotificationEvent, 'recipient_id', [], None),
+    ('notification_events_sent', NotificationEvent, 'actor_id', [], None),
+    ('notification_archive', NotificationArchive, 'recipient_id', [], None),
+    ('notification_archive_sent', NotificationArchive, 'actor_id', [], None),
+    ('following', Follow, 'to_customuser_id', ['from_customuser_id'], _unfollow_followees),
+    ('followers', Follow, 'from_customuser_id', ['to_customuser_id'], _drop_followers),
+    ('suggestions', FollowSuggestion, 'user_id', [], None),
+    ('suggested', FollowSuggestion, 'suggested_id', [], None),
+]
+
+# After the last stage the (now small) user row itself is deleted
+ACCOUNT = 'account'
+DONE = 'done'
+STAGE_NAMES = [stage[0] for stage in STAGES] + [ACCOUNT]
+
+
+def schedule(user):
+    """
+    Disable `user` now and queue the purge of their data. Returns the
+    AccountDeletion; scheduling an account twice is a no-op.
+    """
+    with transaction.atomic():
+        deletion, _ = AccountDeletion.objects.get_or_create(
+            user_id=user.pk, defaults={'username': user.username, 'stage': STAGE_NAMES[0]}
+        )
+        if user.is_active:
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+            # Their posts are hidden from now on; drop cached responses showing them
+            transaction.on_commit(response_cache.bump_all)
+        Token.objects.filter(user=user).delete()
+    return deletion
+
+
+def pending():
+    return AccountDeletion.objects.filter(finished_at__isnull=True).order_by('requested_at', 'pk')
+
+
+def step(deletion, batch_size=1000):
+    """Purge one batch of `deletion`'s current stage. Returns the rows deleted."""
+    # post_delete fires for every like, comment and post; expire each cached post once
+    with transaction.atomic(), response_cache.batch():
+        if deletion.stage == ACCOUNT:
+            deleted, _ = CustomUser.objects.filter(pk=deletion.user_id).delete()
+            deletion.stage = DONE
+            deletion.finished_at = timezone.now()
+        else:
+            _, model, lookup, fields, hook = STAGES[STAGE_NAMES.index(deletion.stage)]
+            rows = list(
+                model.objects.filter(**{lookup: deletion.user_id}, pk__gt=deletion.cursor)
+                .order_by('pk')
+                .values('pk', *fields)[:batch_size]
+            )
+            deleted = 0
+            if rows:
+                deleted, _ = model.objects.filter(pk__in=[row['pk'] for row in rows]).delete()
+                if hook is not None:
+                    hook(deletion.user_id, rows)
+                deletion.cursor = rows[-1]['pk']
+            if len(rows) < batch_size:
+                deletion.stage = STAGE_NAMES[STAGE_NAMES.index(deletion.stage) + 1]
+                deletion.cursor = 0
+
+        deletion.purged_rows += deleted
+        deletion.save(update_fields=['stage', 'cursor', 'purged_rows', 'finished_at'])
+    return deleted
+
+
+def purge(deletion, batch_size=1000, pause=0):
+    """
+    Run `deletion` to completion from wherever it stopped. Yields the
+    number of rows deleted by each batch.
+    """
+    while deletion.finished_at is None:
+        yield step(deletion, batch_size)
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,68 @@
+"""
+Streaming export of everything an account has created or received.
+
+`ndjson()` yields one JSON document per line: an `account` record, then the
+user's posts, comments and likes and the notifications they received, each
+in primary-key order. Every table is walked in keyset chunks of
+`chunk_size` rows (`pk > last seen`), read with `QuerySet.iterator()` as plain
+`values()` dicts. Memory stays flat however much data the account holds, and
+no database cursor is held open between chunks while the client reads.
+"""
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from notifications.models import Notification
+from posts.models import Comment, Like, Post
+
+
+def _sections(user):
+    return [
+        ('post', Post.objects.filter(author=user).values(
+            'id', 'title', 'content', 'created_at', 'updated_at', 'like_count', 'comment_count',
+        )),
+        ('comment', Comment.objects.filter(author=user).values(
+            'id', 'post_id', 'content', 'created_at', 'updated_at',
+        )),
+        ('like', Like.objects.filter(user=user).values('id', 'post_id', 'created_at')),
+        ('notification', Notification.objects.filter(recipient=user).values(
+            'id', 'verb', 'object_id', 'actor_count', 'timestamp', 'read',
+            actor_username=F('actor__username'), target_type=F('content_type__model'),
+        )),
+    ]
+
+
+def keyset_rows(queryset, chunk_size):
+    """Yield every row of a `values()` queryset in `id` order, `chunk_size` at a time."""
+    last_id = 0
+    while True:
+        chunk = queryset.filter(pk__gt=last_id).order_by('pk')[:chunk_size]
+        count = 0
+        for row in chunk.iterator(chunk_size=chunk_size):
+            count += 1
+            last_id = row['id']
+            yield row
+        if count < chunk_size:
+            return
+
+
+def records(user, chunk_size=None):
+    """Yield (type, row) for every exported row of `user`."""
+    chunk_size = chunk_size or settings.ACCOUNT_EXPORT_CHUNK_SIZE
+    yield 'account', {
+        'id': user.pk,
+        'username': user.username,
+        'email': user.email,
+        'bio': user.bio,
+        'date_joined': user.date_joined,
+    }
+    for record_type, queryset in _sections(user):
+        for row in keyset_rows(queryset, chunk_size):
+            yield record_type, row
+
+
+def ndjson(user, chunk_size=None):
+    """Encode `records()` as newline-delimited JSON lines."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for record_type, row in records(user, chunk_size):
+        yield encoder.encode({'type': record_type, **row}) + '\n'
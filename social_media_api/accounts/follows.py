@@ -0,0 +1,130 @@
+"""
+Follow and unfollow accounts.
+
+Every change to the followers relationship goes through here so the
+denormalized follower/following counters, the cached follow graph and the
+followers' home timelines stay in step with the through table.
+"""
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from posts import timeline
+from . import graph
+from .models import CustomUser, Follow
+
+
+def follow(user, target):
+    """Make `user` follow `target`. Returns False if they already did."""
+    with transaction.atomic():
+        _, created = Follow.objects.get_or_create(from_customuser=target, to_customuser=user)
+        if created:
+            CustomUser.objects.filter(pk=user.pk).update(following_count=F('following_count') + 1)
+            CustomUser.objects.filter(pk=target.pk).update(follower_count=F('follower_count') + 1)
+            transaction.on_commit(lambda: graph.invalidate(user.pk, [target.pk]))
+    if created:
+        timeline.add_authors(user.pk, [target.pk])
+    return created
+
+
+def _returning_followees(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+def _edge_columns():
+    qn = connection.ops.quote_name
+    return (
+        qn(Follow._meta.db_table),
+        qn(Follow._meta.get_field('from_customuser').column),
+        qn(Follow._meta.get_field('to_customuser').column),
+    )
+
+
+# The bulk paths use RETURNING so they see exactly the edges their own
+# statement inserted or deleted, never rows written by a concurrent request.
+
+def _insert_edges(user_id, target_ids):
+    """Insert the missing edges from `user_id` to `target_ids`; returns the followees inserted."""
+    table, followee, follower = _edge_columns()
+    rows = ', '.join(['(%s, %s)'] * len(target_ids))
+    return _returning_followees(
+        f'INSERT INTO {table} ({followee}, {follower}) VALUES {rows} '
+        f'ON CONFLICT DO NOTHING RETURNING {followee}',
+        [value for pk in target_ids for value in (pk, user_id)],
+    )
+
+
+def _delete_edges(user_id, target_ids):
+    """Delete the edges from `user_id` to `target_ids`; returns the followees deleted."""
+    table, followee, follower = _edge_columns()
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    return _returning_followees(
+        f'DELETE FROM {table} WHERE {follower} = %s AND {followee} IN ({placeholders}) '
+        f'RETURNING {followee}',
+        [user_id, *target_ids],
+    )
+
+
+def follow_many(user, target_ids):
+    """
+    Make `user` follow every active account in `target_ids` in one batch.
+
+    The targets are validated with a single IN query and the new edges are
+    inserted with one INSERT that skips existing edges. Counters, the graph
+    cache and the timeline are then updated once for the whole batch, from
+    the edges that statement really inserted. Returns `(found, created)`:
+    the IDs that exist and the ones newly followed.
+    """
+    found = set(
+        CustomUser.objects.filter(pk__in=set(target_ids), is_active=True)
+        .exclude(pk=user.pk)
+        .values_list('pk', flat=True)
+    )
+    created = []
+    with transaction.atomic():
+        if found:
+            created = _insert_edges(user.pk, sorted(found))
+        if created:
+            CustomUser.objects.filter(pk=user.pk).update(following_count=F('following_count') + len(created))
+            CustomUser.objects.filter(pk__in=created).update(follower_count=F('follower_count') + 1)
+            transaction.on_commit(lambda: graph.invalidate(user.pk, created))
+    if created:
+        timeline.add_authors(user.pk, created)
+    return found, created
+
+
+def unfollow(user, target):
+    """Make `user` stop following `target`. Returns False if they did not follow them."""
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(from_customuser=target, to_customuser=user).delete()
+        if deleted:
+            CustomUser.objects.filter(pk=user.pk, following_count__gt=0).update(following_count=F('following_count') - 1)
+            CustomUser.objects.filter(pk=target.pk, follower_count__gt=0).update(follower_count=F('follower_count') - 1)
+            transaction.on_commit(lambda: graph.invalidate(user.pk, [target.pk]))
+    if deleted:
+        timeline.remove_authors(user.pk, [target.pk])
+    return bool(deleted)
+
+
+def unfollow_many(user, target_ids):
+    """
+    Make `user` stop following every account in `target_ids` with one
+    DELETE, updating counters, the graph cache and the timeline once for
+    the edges it removed. Returns the IDs that were unfollowed.
+    """
+    target_ids = sorted(set(target_ids))
+    with transaction.atomic():
+        removed = _delete_edges(user.pk, target_ids) if target_ids else []
+        if removed:
+            CustomUser.objects.filter(pk=user.pk).update(
+                following_count=Greatest(F('following_count') - len(removed), 0)
+            )
+            CustomUser.objects.filter(pk__in=removed, follower_count__gt=0).update(
+                follower_count=F('follower_count') - 1
+            )
+            transaction.on_commit(lambda: graph.invalidate(user.pk, removed))
+    if removed:
+        timeline.remove_authors(user.pk, removed)
+    return removed
@@ -0,0 +1,157 @@
+"""
+Cached, compact index of the follow graph.
+
+For each user we keep the IDs they follow and the IDs following them as sorted
+`array('q')` values: 8 bytes per edge instead of a Python int object each,
+binary-searchable for O(log n) membership checks and mergeable for set
+intersections.
+
+Lookups go through a small in-process LRU first and then the shared Django
+cache, and only hit the through table on a miss. `accounts.follows` calls
+`invalidate()` whenever an edge changes. The in-process copy of another
+worker may lag by up to FOLLOW_GRAPH_LOCAL_TTL seconds, so use the through
+table, not this index, when a write depends on the answer.
+
+Shared entries are keyed by a per-user version that `invalidate()` bumps
+rather than deleted. A reader that loaded the edges just before a change
+committed therefore stores its stale copy under the old version, where no
+later lookup finds it.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow
+
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+
+_local = OrderedDict()
+_lock = threading.Lock()
+
+
+def _key(kind, user_id):
+    return f'accounts:graph:{kind}:{user_id}'
+
+
+def _version_key(kind, user_id):
+    return f'accounts:graph:version:{kind}:{user_id}'
+
+
+def _version(kind, user_id):
+    key = _version_key(kind, user_id)
+    version = cache.get(key)
+    if version is None:
+        # Never restart at a value an older entry may still carry
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _load(kind, user_id):
+    if kind == FOLLOWING:
+        ids = (
+            Follow.objects.filter(to_customuser_id=user_id)
+            .order_by('from_customuser_id')
+            .values_list('from_customuser_id', flat=True)
+        )
+    else:
+        ids = (
+            Follow.objects.filter(from_customuser_id=user_id)
+            .order_by('to_customuser_id')
+            .values_list('to_customuser_id', flat=True)
+        )
+    return array('q', ids)
+
+
+def _ids(kind, user_id):
+    key = _key(kind, user_id)
+    now = time.monotonic()
+    with _lock:
+        entry = _local.get(key)
+        if entry is not None and entry[0] > now:
+            _local.move_to_end(key)
+            return entry[1]
+
+    shared_key = f'{key}:{_version(kind, user_id)}'
+    packed = cache.get(shared_key)
+    if packed is None:
+        ids = _load(kind, user_id)
+        cache.set(shared_key, ids.tobytes(), settings.FOLLOW_GRAPH_CACHE_TTL)
+    else:
+        ids = array('q')
+        ids.frombytes(packed)
+
+    with _lock:
+        _local[key] = (now + settings.FOLLOW_GRAPH_LOCAL_TTL, ids)
+        _local.move_to_end(key)
+        while len(_local) > settings.FOLLOW_GRAPH_LOCAL_MAX_ENTRIES:
+            _local.popitem(last=False)
+    return ids
+
+
+def following_ids(user_id):
+    """Sorted IDs of the accounts `user_id` follows."""
+    return _ids(FOLLOWING, user_id)
+
+
+def follower_ids(user_id):
+    """Sorted IDs of the accounts following `user_id`."""
+    return _ids(FOLLOWERS, user_id)
+
+
+def contains(ids, value):
+    i = bisect_left(ids, value)
+    return i < len(ids) and ids[i] == value
+
+
+def intersect(a, b):
+    """
+    Intersection of two sorted ID arrays. Walks the shorter one and
+    binary-searches the longer one from the last match onward, so it costs
+    O(m log n) for very lopsided sizes and stays linear-ish otherwise.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    result = array('q')
+    lo = 0
+    for value in a:
+        lo = bisect_left(b, value, lo)
+        if lo == len(b):
+            break
+        if b[lo] == value:
+            result.append(value)
+    return result
+
+
+def is_following(user_id, target_id):
+    return contains(following_ids(user_id), target_id)
+
+
+def mutual_follows(user_id):
+    """IDs of accounts that `user_id` follows and that follow them back."""
+    return intersect(following_ids(user_id), follower_ids(user_id))
+
+
+def common_following(user_id, other_id):
+    """IDs of accounts followed by both users."""
+    return intersect(following_ids(user_id), following_ids(other_id))
+
+
+def invalidate(follower_id, followee_ids):
+    """Forget the cached edges touched by `follower_id` (un)following `followee_ids`."""
+    touched = [(FOLLOWING, follower_id)] + [(FOLLOWERS, pk) for pk in followee_ids]
+    for kind, user_id in touched:
+        try:
+            cache.incr(_version_key(kind, user_id))
+        except ValueError:
+            # No version yet, so nothing is cached for this user
+            pass
+    with _lock:
+        for kind, user_id in touched:
+            _local.pop(_key(kind, user_id), None)
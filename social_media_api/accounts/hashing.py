@@ -0,0 +1,58 @@
+"""
+Bounded thread pool for password hashing under ASGI.
+
+PBKDF2 deliberately burns hundreds of milliseconds of CPU. Running it inline
+pins a worker for that long, and running it through sync_to_async funnels
+every hash through the single thread-sensitive executor. The async
+register/login views submit it here instead: PASSWORD_HASHING_WORKERS threads
+do the work and at most PASSWORD_HASHING_QUEUE_SIZE further requests may
+wait. Beyond that `HashingPoolSaturated` is raised so the view can shed load
+with a 503 instead of queueing without bound.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+
+class HashingPoolSaturated(Exception):
+    """Every hashing worker is busy and the wait queue is full."""
+
+
+_executor = None
+_slots = None
+_init_lock = threading.Lock()
+
+
+def _pool():
+    global _executor, _slots
+    with _init_lock:
+        if _executor is None:
+            workers = settings.PASSWORD_HASHING_WORKERS
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+            _slots = threading.BoundedSemaphore(workers + settings.PASSWORD_HASHING_QUEUE_SIZE)
+    return _executor, _slots
+
+
+async def run(func, *args):
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        raise HashingPoolSaturated
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    finally:
+        slots.release()
+
+
+async def amake_password(password):
+    return await run(make_password, password)
+
+
+async def acheck_password(password, encoded, setter=None):
+    """
+    Like check_password(); `setter(password)` is called from the pool thread
+    when the hash needs upgrading, so it must not touch the database.
+    """
+    return await run(check_password, password, encoded, setter)
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive concurrent logins through the sync (WSGI) and async (ASGI) login "
+        "endpoints in-process and print their throughput as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help="Logins sent to each endpoint (default: 200).",
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=16,
+            help="Logins in flight at once (default: 16).",
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        username = '__login_benchmark__'
+        User.objects.filter(username=username).delete()
+        User.objects.create_user(username=username, password='benchmark-password')
+        credentials = {'username': username, 'password': 'benchmark-password'}
+        try:
+            results = {
+                'sync': self.run_sync(credentials, options['requests'], options['concurrency']),
+                'async': asyncio.run(self.run_async(credentials, options['requests'], options['concurrency'])),
+            }
+        finally:
+            User.objects.filter(username=username).delete()
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run_sync(self, credentials, requests, concurrency):
+        url = reverse('login')
+
+        def login(_):
+            try:
+                return Client().post(url, credentials, content_type='application/json').status_code
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            statuses = list(pool.map(login, range(requests)))
+        return self.summarize(statuses, time.perf_counter() - started)
+
+    async def run_async(self, credentials, requests, concurrency):
+        url = reverse('login_async')
+        client = AsyncClient()
+        in_flight = asyncio.Semaphore(concurrency)
+
+        async def login():
+            async with in_flight:
+                response = await client.post(url, credentials, content_type='application/json')
+                return response.status_code
+
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(login() for _ in range(requests)))
+        return self.summarize(statuses, time.perf_counter() - started)
+
+    def summarize(self, statuses, elapsed):
+        return {
+            'requests': len(statuses),
+            'seconds': round(elapsed, 3),
+            'requests_per_second': round(len(statuses) / elapsed, 2),
+            'status_codes': dict(Counter(statuses)),
+        }
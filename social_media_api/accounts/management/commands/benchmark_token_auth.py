@@ -0,0 +1,63 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from accounts import authentication
+from accounts.authentication import CachedTokenAuthentication
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare database queries and time per authenticated request between DRF's "
+        "TokenAuthentication and CachedTokenAuthentication. Prints JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=1000,
+            help="Number of authenticated requests to simulate per backend (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        # Work inside a transaction that is always rolled back so the
+        # benchmark user and token never persist
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(username='__token_auth_benchmark__')
+            token = Token.objects.create(user=user)
+            results = {
+                backend.__name__: self.measure(backend, token.key, options['requests'])
+                for backend in (TokenAuthentication, CachedTokenAuthentication)
+            }
+            transaction.set_rollback(True)
+
+        authentication.invalidate(token.key)
+        authentication.expire_user(user.pk)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def measure(self, backend, key, requests):
+        # Start each backend cold without touching other cache entries
+        authentication.invalidate(key)
+        factory = APIRequestFactory()
+        authenticator = backend()
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(requests):
+                request = Request(factory.get('/', HTTP_AUTHORIZATION=f'Token {key}'))
+                authenticator.authenticate(request)
+            elapsed = time.perf_counter() - started
+
+        return {
+            'requests': requests,
+            'queries': len(queries),
+            'queries_per_request': len(queries) / requests,
+            'microseconds_per_request': round(elapsed / requests * 1e6, 2),
+        }
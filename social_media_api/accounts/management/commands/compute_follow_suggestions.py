@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.models import Follow, FollowSuggestion
+
+
+class Command(BaseCommand):
+    help = (
+        "Rank friends-of-friends follow suggestions for every active user by "
+        "mutual-follow count and store the top K per user."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k', type=int, default=settings.FOLLOW_SUGGESTIONS_TOP_K,
+            help="Suggestions kept per user (default: FOLLOW_SUGGESTIONS_TOP_K).",
+        )
+        parser.add_argument(
+            '--block-size', type=int, default=2000,
+            help="Users whose suggestions are computed and written per step (default: 2000).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            import numpy as np
+            from scipy import sparse
+        except ImportError:
+            raise CommandError("compute_follow_suggestions requires numpy and scipy (pip install numpy scipy).")
+
+        top_k = options['top_k']
+        block_size = options['block_size']
+
+        # Map active user ids onto matrix rows/columns
+        user_ids = np.fromiter(
+            get_user_model().objects.filter(is_active=True).order_by('pk').values_list('pk', flat=True),
+            dtype=np.int64,
+        )
+        n = len(user_ids)
+        if n == 0:
+            self.stdout.write("No active users.")
+            return
+
+        # A[i, j] = 1 when user i follows user j
+        edges = np.array(
+            Follow.objects.filter(
+                to_customuser__is_active=True, from_customuser__is_active=True
+            ).values_list('to_customuser_id', 'from_customuser_id'),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        rows = np.searchsorted(user_ids, edges[:, 0])
+        cols = np.searchsorted(user_ids, edges[:, 1])
+        A = sparse.csr_matrix((np.ones(len(edges), dtype=np.int32), (rows, cols)), shape=(n, n))
+
+        written = 0
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            block = A[start:stop]
+
+            # (A @ A)[i, c] counts the accounts i follows that follow c. Drop
+            # accounts i already follows and i itself.
+            scores = (block @ A).tocsr()
+            scores = (scores - scores.multiply(block)).tocoo()
+            keep = (scores.data > 0) & (scores.col != scores.row + start)
+            owner, candidate, score = scores.row[keep], scores.col[keep], scores.data[keep]
+
+            # Top K per owner: sort by (owner, -score, candidate) and keep the
+            # first K entries of each owner's run
+            order = np.lexsort((candidate, -score, owner))
+            owner, candidate, score = owner[order], candidate[order], score[order]
+            run_start = np.searchsorted(owner, owner, side='left')
+            keep = (np.arange(len(owner)) - run_start) < top_k
+            owner, candidate, score = owner[keep], candidate[keep], score[keep]
+
+            suggestions = [
+                FollowSuggestion(user_id=int(user_ids[o + start]), suggested_id=int(user_ids[c]), score=int(s))
+                for o, c, s in zip(owner, candidate, score)
+            ]
+            with transaction.atomic():
+                FollowSuggestion.objects.filter(user_id__in=user_ids[start:stop].tolist()).delete()
+                FollowSuggestion.objects.bulk_create(suggestions, batch_size=1000)
+            written += len(suggestions)
+
+        self.stdout.write(self.style.SUCCESS(f"Stored {written} suggestion(s) for {n} user(s)."))
@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import export
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream every post, comment, like and notification of an account as "
+        "NDJSON to stdout or a file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            '--output', '-o',
+            help="File to write to instead of stdout.",
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=None,
+            help="Rows read per query (default: ACCOUNT_EXPORT_CHUNK_SIZE).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user named {options['username']!r}.")
+
+        lines = export.ndjson(user, options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import thumbnails
+
+
+class Command(BaseCommand):
+    help = "Render the resized variants of newly uploaded profile pictures."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=20,
+            help="Maximum number of jobs processed per pass (default: 20).",
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep running and poll for new jobs instead of exiting once none are available.",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help="Seconds to sleep between polls of an empty queue with --loop (default: 1).",
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            handled = thumbnails.drain(options['batch_size'])
+            processed += handled
+            if handled:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} thumbnail job(s)."))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import deletion
+
+
+class Command(BaseCommand):
+    help = (
+        "Purge the data of accounts scheduled for deletion in small primary-key "
+        "batches, resuming any purge that was interrupted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Maximum number of rows deleted per transaction (default: 1000).",
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help="Seconds to sleep between batches so other writers can get the lock (default: 0.05).",
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep running and poll for new deletions instead of exiting once none are pending.",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=10.0,
+            help="Seconds to sleep between polls with --loop (default: 10).",
+        )
+
+    def handle(self, *args, **options):
+        finished = 0
+        while True:
+            pending = list(deletion.pending())
+            for account in pending:
+                for _ in deletion.purge(account, options['batch_size'], options['pause']):
+                    pass
+                finished += 1
+                self.stdout.write(f"  {account.username}: purged {account.purged_rows} row(s)")
+            if pending:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {finished} deleted account(s)."))
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='customuser',
+            name='date_of_birth',
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='bio',
+            field=models.TextField(blank=True, help_text='A short description of the user.', max_length=500, null=True, verbose_name='Biography'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='followers',
+            field=models.ManyToManyField(blank=True, help_text='Users who follow this account.', related_name='following', to=settings.AUTH_USER_MODEL, verbose_name='Followers'),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='groups',
+            field=models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='custom_user_groups', related_query_name='custom_user', to='auth.group', verbose_name='groups'),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_picture',
+            field=models.ImageField(blank=True, help_text='Upload a profile image for your account.', null=True, upload_to='profile_pics/', verbose_name='Profile Picture'),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='user_permissions',
+            field=models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='custom_user_permissions', related_query_name='custom_user_permission', to='auth.permission', verbose_name='user permissions'),
+        ),
+    ]
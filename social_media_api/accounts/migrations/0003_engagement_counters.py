@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:48
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    Follow = CustomUser.followers.through
+
+    def count_of(field):
+        rows = Follow.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(n=Count('pk')).values('n')
+        return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+    CustomUser.objects.update(
+        follower_count=count_of('from_customuser'),
+        following_count=count_of('to_customuser'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_remove_customuser_date_of_birth_customuser_bio_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('suggested', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follow_suggestions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-score'], name='suggestion_user_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'suggested'), name='unique_follow_suggestion')],
+            },
+        ),
+    ]
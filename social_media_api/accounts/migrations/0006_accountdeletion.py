@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(unique=True)),
+                ('username', models.CharField(max_length=150)),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('stage', models.CharField(max_length=32)),
+                ('cursor', models.BigIntegerField(default=0)),
+                ('purged_rows', models.PositiveBigIntegerField(default=0)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
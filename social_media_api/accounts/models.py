@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 class CustomUser(AbstractUser):
@@ -28,6 +29,11 @@ class CustomUser(AbstractUser):
         help_text=_("Upload a profile image for your account.")
     )
     
+    # Storage names of the resized copies of profile_picture, keyed by the
+    # variant names in PROFILE_PICTURE_VARIANTS. Filled in by the
+    # process_thumbnails worker (accounts.thumbnails) after an upload.
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
+    
     # 2. Self-Referencing Many-to-Many Relationship for Followers
     # - 'self': References the CustomUser model itself.
     # - symmetrical=False: Allows User A to follow User B without User B automatically following User A.
@@ -42,6 +48,12 @@ class CustomUser(AbstractUser):
         help_text=_("Users who follow this account.")
     )
 
+    # Denormalized sizes of the followers relationship, maintained with F()
+    # updates by accounts.follows so profiles never need a COUNT(*).
+    # `reconcile_counters` repairs any drift.
+    follower_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+
     # 3. FIXES for E304 Clashes (Required when extending AbstractUser)
     # These override the inherited fields to provide unique reverse accessors.
     groups = models.ManyToManyField(
@@ -72,4 +84,75 @@ class CustomUser(AbstractUser):
         verbose_name_plural = _('users')
     
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username
+
+# The auto-created through table behind CustomUser.followers. A row means
+# `to_customuser` follows `from_customuser`.
+Follow = CustomUser.followers.through
+
+
+class FollowSuggestion(models.Model):
+    """
+    A precomputed "people you may know" entry: `score` accounts that `user`
+    follows also follow `suggested`. Rebuilt offline by the
+    compute_follow_suggestions command and read by the suggestions endpoint.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='follow_suggestions')
+    suggested = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField()
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'suggested'], name='unique_follow_suggestion'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-score'], name='suggestion_user_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.suggested} for {self.user} ({self.score} mutual)"
+
+
+class ThumbnailJob(models.Model):
+    """
+    A pending request to render the PROFILE_PICTURE_VARIANTS of `user`'s
+    profile picture, as it was named (`source`) when the job was queued.
+    Drained by the process_thumbnails worker; a job is leased by pushing
+    `available_at` into the future and deleted once done.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    source = models.CharField(max_length=255)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at'], name='thumbnailjob_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"Thumbnails of {self.source}"
+
+
+class AccountDeletion(models.Model):
+    """
+    Progress of purging a deleted account, driven by the
+    purge_deleted_accounts worker (accounts.deletion).
+
+    `stage` names the table being purged and `cursor` the last primary key
+    removed from it, so an interrupted purge resumes where it stopped. The
+    row is keyed by the former user's ID rather than a foreign key so that it
+    outlives the user as a record of the deletion.
+    """
+    user_id = models.BigIntegerField(unique=True)
+    username = models.CharField(max_length=150)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    stage = models.CharField(max_length=32)
+    cursor = models.BigIntegerField(default=0)
+    purged_rows = models.PositiveBigIntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Deletion of {self.username} ({self.stage})"
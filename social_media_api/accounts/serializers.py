@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from rest_framework.authtoken.models import Token
+from . import thumbnails
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField()
@@ -11,18 +13,58 @@ class RegisterSerializer(serializers.ModelSerializer):
         extra_kwargs = {'password': {'write_only': True}}
 
     def create(self, validated_data):
-        user = get_user_model().objects.create_user(
-            username=validated_data['username'],
-            password=validated_data['password'],
-            email=validated_data.get('email'),
+        # The async register view hashes the password on the bounded hashing
+        # pool and passes the result in as `password_hash`
+        password_hash = validated_data.get('password_hash') or make_password(validated_data['password'])
+
+        User = get_user_model()
+        user = User(
+            username=User.normalize_username(validated_data['username']),
+            email=User.objects.normalize_email(validated_data.get('email')),
             bio=validated_data.get('bio'),
             profile_picture=validated_data.get('profile_picture')
         )
+        user.password = password_hash
+        user.save()
 
         Token.objects.create(user=user)
+        # Variants are rendered by the process_thumbnails worker, not here
+        thumbnails.enqueue(user)
         return user
 
+class ProfilePictureVariantsField(serializers.Field):
+    """URLs of the resized profile picture variants rendered so far."""
+    def __init__(self, **kwargs):
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, user):
+        return thumbnails.variant_urls(user, self.context.get('request'))
+
 class UserSerializer(serializers.ModelSerializer):
+    # Followers are paged through /api/accounts/<id>/followers/ instead of
+    # being listed here
+    profile_picture_variants = ProfilePictureVariantsField()
+
+    class Meta:
+        model = get_user_model()
+        fields = [
+            'id', 'username', 'email', 'bio', 'profile_picture', 'profile_picture_variants',
+            'follower_count', 'following_count',
+        ]
+        read_only_fields = ['follower_count', 'following_count']
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    """The public fields shown for each entry of a followers/following list."""
+    profile_picture_variants = ProfilePictureVariantsField()
+
     class Meta:
         model = get_user_model()
-        fields = ['id', 'username', 'email', 'bio', 'profile_picture', 'followers']
\ No newline at end of file
+        fields = ['id', 'username', 'profile_picture', 'profile_picture_variants']
+
+class FollowSuggestionSerializer(serializers.Serializer):
+    user = UserSummarySerializer(source='suggested')
+    mutual_count = serializers.IntegerField(source='score')
+
+class BulkFollowSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000)
\ No newline at end of file
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import authentication
+from .models import CustomUser
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    authentication.invalidate(instance.key)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def expire_cached_user(sender, instance, **kwargs):
+    # Deactivation, password changes and profile edits apply to the next request
+    authentication.expire_user(instance.pk)
@@ -1,3 +1,644 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from array import array
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from notifications.models import Notification
+from posts.models import Comment, Like, Post
+from posts import timeline
+from . import authentication, deletion, export, follows, graph, hashing, thumbnails
+from .models import AccountDeletion, FollowSuggestion, ThumbnailJob
+from .serializers import UserSerializer
+
+try:
+    import scipy
+except ImportError:
+    scipy = None
+
+User = get_user_model()
+
+
+class FollowTestCase(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='password123')
+        self.bob = User.objects.create_user(username='bob', password='password123')
+        self.client.force_authenticate(self.alice)
+
+    def assertCounts(self, follower_count, following_count):
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.follower_count, follower_count)
+        self.assertEqual(self.alice.following_count, following_count)
+
+    def test_follow_and_unfollow_update_counters(self):
+        """
+        Following and unfollowing adjust both sides' counters exactly once.
+        """
+        follow_url = reverse('follow_user', kwargs={'user_id': self.bob.pk})
+        unfollow_url = reverse('unfollow_user', kwargs={'user_id': self.bob.pk})
+
+        self.assertEqual(self.client.post(follow_url).status_code, status.HTTP_200_OK)
+        self.client.post(follow_url)
+        self.assertCounts(1, 1)
+        self.assertTrue(self.alice.following.filter(pk=self.bob.pk).exists())
+
+        self.assertEqual(self.client.post(unfollow_url).status_code, status.HTTP_200_OK)
+        self.client.post(unfollow_url)
+        self.assertCounts(0, 0)
+
+    def test_bulk_follow(self):
+        """
+        Bulk follow inserts only new edges and updates counters once.
+        """
+        carol = User.objects.create_user(username='carol', password='password123')
+        follows.follow(self.alice, self.bob)
+        requested = [self.bob.pk, carol.pk, self.alice.pk, 999]
+
+        response = self.client.post(reverse('bulk_follow'), {'user_ids': requested}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'followed': [carol.pk],
+            'already_following': [self.bob.pk],
+            'not_found': [self.alice.pk, 999],
+        })
+        self.assertCounts(1, 2)
+        carol.refresh_from_db()
+        self.assertEqual(carol.follower_count, 1)
+        self.assertTrue(self.alice.following.filter(pk=carol.pk).exists())
+
+    def test_bulk_follow_counts_only_edges_it_inserted(self):
+        """
+        An edge that already exists when the batch is inserted (e.g. written
+        by a concurrent request) is not counted again.
+        """
+        carol = User.objects.create_user(username='carol', password='password123')
+        insert = follows._insert_edges
+
+        def insert_after_concurrent_follow(user_id, target_ids):
+            follows.follow(self.alice, self.bob)
+            return insert(user_id, target_ids)
+
+        with mock.patch.object(follows, '_insert_edges', insert_after_concurrent_follow):
+            found, created = follows.follow_many(self.alice, [self.bob.pk, carol.pk])
+        self.assertEqual(created, [carol.pk])
+        self.assertCounts(1, 2)
+
+    def test_bulk_unfollow(self):
+        """
+        Bulk unfollow removes only existing edges and updates counters once.
+        """
+        carol = User.objects.create_user(username='carol', password='password123')
+        follows.follow(self.alice, self.bob)
+        follows.follow(self.alice, carol)
+        Post.objects.create(author=carol, title='Hello', content='World')
+        timeline.rebuild(self.alice.pk)
+
+        response = self.client.post(reverse('bulk_unfollow'), {'user_ids': [carol.pk, 999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'unfollowed': [carol.pk], 'not_following': [999]})
+        self.assertCounts(1, 1)
+        carol.refresh_from_db()
+        self.assertEqual(carol.follower_count, 0)
+        self.assertFalse(self.alice.following.filter(pk=carol.pk).exists())
+        self.assertFalse(timeline.feed_queryset(self.alice).exists())
+
+    def test_cannot_follow_yourself(self):
+        response = self.client.post(reverse('follow_user', kwargs={'user_id': self.alice.pk}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertCounts(0, 0)
+
+
+class FollowGraphTestCase(APITestCase):
+    def setUp(self):
+        """
+        alice and bob follow each other; both follow carol.
+        """
+        cache.clear()
+        graph._local.clear()
+        self.alice, self.bob, self.carol = [
+            User.objects.create_user(username=name, password='password123') for name in ('alice', 'bob', 'carol')
+        ]
+        for user, target in [(self.alice, self.bob), (self.bob, self.alice), (self.alice, self.carol), (self.bob, self.carol)]:
+            follows.follow(user, target)
+
+    def test_lookups_are_cached_sorted_arrays(self):
+        ids = graph.following_ids(self.alice.pk)
+        self.assertEqual(ids, array('q', sorted([self.bob.pk, self.carol.pk])))
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(self.alice.pk, self.carol.pk))
+            self.assertFalse(graph.is_following(self.alice.pk, self.alice.pk))
+
+    def test_intersections(self):
+        self.assertEqual(list(graph.mutual_follows(self.alice.pk)), [self.bob.pk])
+        self.assertEqual(list(graph.common_following(self.alice.pk, self.bob.pk)), [self.carol.pk])
+        self.assertEqual(list(graph.intersect(array('q', [1, 3, 5, 7]), array('q', [2, 3, 7]))), [3, 7])
+
+    def test_unfollow_invalidates_index(self):
+        """
+        Unfollowing through the API is reflected by the next lookup.
+        """
+        self.assertTrue(graph.is_following(self.alice.pk, self.carol.pk))
+        self.client.force_authenticate(self.alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('unfollow_user', kwargs={'user_id': self.carol.pk}))
+        self.assertFalse(graph.is_following(self.alice.pk, self.carol.pk))
+
+        response = self.client.get(reverse('user_relationship', kwargs={'user_id': self.bob.pk}))
+        self.assertEqual(response.data, {'following': True, 'followed_by': True, 'common_following_count': 0})
+
+    def test_change_during_a_miss_does_not_cache_stale_edges(self):
+        """
+        Edges read just before an unfollow commits are not served afterwards.
+        """
+        graph.following_ids(self.alice.pk)
+        graph.invalidate(self.alice.pk, [])
+        load = graph._load
+
+        def load_then_unfollow(kind, user_id):
+            ids = load(kind, user_id)
+            self.alice.following.remove(self.carol)
+            graph.invalidate(self.alice.pk, [self.carol.pk])
+            return ids
+
+        with mock.patch.object(graph, '_load', load_then_unfollow):
+            self.assertTrue(graph.is_following(self.alice.pk, self.carol.pk))
+        graph._local.clear()
+        self.assertFalse(graph.is_following(self.alice.pk, self.carol.pk))
+
+
+class FollowListTestCase(APITestCase):
+    def setUp(self):
+        """
+        A popular account followed by several users.
+        """
+        self.star = User.objects.create_user(username='star', password='password123')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='password123') for i in range(5)]
+        for fan in self.fans:
+            follows.follow(fan, self.star)
+        self.client.force_authenticate(self.fans[0])
+
+    def test_followers_are_paged_newest_first(self):
+        url = reverse('user_followers', kwargs={'user_id': self.star.pk}) + '?page_size=3'
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual([user['username'] for user in response.data['results']], ['fan4', 'fan3', 'fan2'])
+        self.assertEqual(set(response.data['results'][0]), {'id', 'username', 'profile_picture', 'profile_picture_variants'})
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([user['username'] for user in response.data['results']], ['fan1', 'fan0'])
+        self.assertIsNone(response.data['next'])
+
+    def test_following_lists_followed_accounts(self):
+        response = self.client.get(reverse('user_following', kwargs={'user_id': self.fans[0].pk}))
+        self.assertEqual([user['username'] for user in response.data['results']], ['star'])
+
+    def test_user_serializer_exposes_counts_not_follower_ids(self):
+        data = UserSerializer(User.objects.get(pk=self.star.pk)).data
+        self.assertNotIn('followers', data)
+        self.assertEqual(data['follower_count'], 5)
+
+    def test_unknown_user_returns_404(self):
+        response = self.client.get(reverse('user_followers', kwargs={'user_id': 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@skipUnless(scipy, "compute_follow_suggestions requires numpy and scipy")
+class FollowSuggestionTestCase(APITestCase):
+    def setUp(self):
+        """
+        me follows a and b; a and b both follow x, only a follows y.
+        """
+        cache.clear()
+        graph._local.clear()
+        names = ('me', 'a', 'b', 'x', 'y')
+        self.users = {name: User.objects.create_user(username=name, password='password123') for name in names}
+        for user, target in [('me', 'a'), ('me', 'b'), ('a', 'x'), ('b', 'x'), ('a', 'y'), ('a', 'me')]:
+            follows.follow(self.users[user], self.users[target])
+        call_command('compute_follow_suggestions', stdout=StringIO())
+        self.client.force_authenticate(self.users['me'])
+
+    def test_suggestions_ranked_by_mutual_follows(self):
+        response = self.client.get(reverse('follow_suggestions'))
+        self.assertEqual(
+            [(row['user']['username'], row['mutual_count']) for row in response.data],
+            [('x', 2), ('y', 1)],
+        )
+        # Neither yourself nor accounts you already follow are suggested
+        self.assertFalse(FollowSuggestion.objects.filter(user=self.users['me'], suggested__username__in=['me', 'a', 'b']).exists())
+
+    def test_top_k_bounds_suggestions(self):
+        call_command('compute_follow_suggestions', top_k=1, stdout=StringIO())
+        self.assertEqual(FollowSuggestion.objects.filter(user=self.users['me']).count(), 1)
+
+
+class CachedTokenAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        authentication._local.clear()
+        self.user = User.objects.create_user(username='alice', password='password123')
+        self.token = Token.objects.create(user=self.user)
+        self.url = reverse('user_relationship', kwargs={'user_id': self.user.pk})
+
+    def get(self, key):
+        return self.client.get(self.url, HTTP_AUTHORIZATION=f'Token {key}')
+
+    def test_warm_token_needs_no_query(self):
+        """
+        Once the token and the user's fields are cached, authentication
+        builds the user without touching the database.
+        """
+        graph.following_ids(self.user.pk)
+        graph.follower_ids(self.user.pk)
+        for _ in range(2):
+            self.assertEqual(self.get(self.token.key).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            response = self.get(self.token.key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cached_user_defers_uncached_fields(self):
+        """
+        Fields outside USER_FIELDS, such as the counters, are read from the
+        database on access rather than served from the cache.
+        """
+        for _ in range(2):
+            self.get(self.token.key)
+        User.objects.filter(pk=self.user.pk).update(follower_count=7)
+        user = authentication._load_user(self.user.pk)
+        self.assertEqual(user.username, 'alice')
+        self.assertIn('follower_count', user.get_deferred_fields())
+        self.assertEqual(user.follower_count, 7)
+
+    def test_saved_changes_apply_to_the_next_request(self):
+        """
+        Saving a user bumps their cached version, so a deactivation or
+        password change is seen by the next request.
+        """
+        for _ in range(2):
+            self.assertEqual(self.get(self.token.key).status_code, status.HTTP_200_OK)
+        self.user.set_password('changed-password')
+        self.user.save()
+        self.assertEqual(self.get(self.token.key).status_code, status.HTTP_200_OK)
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertEqual(self.get(self.token.key).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_is_forgotten(self):
+        self.assertEqual(self.get(self.token.key).status_code, status.HTTP_200_OK)
+        self.token.delete()
+        self.assertEqual(self.get(self.token.key).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_login_keeps_existing_token(self):
+        """
+        Logging in again returns the same token, so other sessions stay valid.
+        """
+        self.assertEqual(self.get(self.token.key).status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('login'), {'username': 'alice', 'password': 'password123'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['token'], self.token.key)
+        self.assertEqual(self.get(self.token.key).status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+
+class AsyncAuthViewsTestCase(TestCase):
+    async def test_register_and_login(self):
+        """
+        The async endpoints register a user and log them in with their token.
+        """
+        response = await self.async_client.post(
+            reverse('register_async'),
+            {'username': 'alice', 'password': 'password123', 'email': 'alice@example.com'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        first_token = response.json()['token']
+        user = await User.objects.aget(username='alice')
+        self.assertTrue(await sync_to_async(user.check_password)('password123'))
+
+        response = await self.async_client.post(
+            reverse('login_async'), {'username': 'alice', 'password': 'password123'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['token'], first_token)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    async def test_login_records_last_login_and_upgrades_hash(self):
+        """
+        Like the sync login, a successful async login sets last_login and
+        re-hashes a password stored with an outdated hasher.
+        """
+        user = await sync_to_async(User.objects.create_user)(username='alice')
+        user.password = await sync_to_async(make_password)('password123', hasher='md5')
+        await user.asave(update_fields=['password'])
+
+        response = await self.async_client.post(
+            reverse('login_async'), {'username': 'alice', 'password': 'password123'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        await user.arefresh_from_db()
+        self.assertIsNotNone(user.last_login)
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(await sync_to_async(user.check_password)('password123'))
+
+    async def test_login_rejects_bad_credentials(self):
+        await sync_to_async(User.objects.create_user)(username='alice', password='password123')
+        for username, password in [('alice', 'wrong'), ('nobody', 'password123')]:
+            response = await self.async_client.post(
+                reverse('login_async'), {'username': username, 'password': password}, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_saturated_pool_returns_503(self):
+        """
+        When every hashing slot is taken the request is shed with Retry-After.
+        """
+        _, slots = hashing._pool()
+        held = 0
+        while slots.acquire(blocking=False):
+            held += 1
+        try:
+            response = await self.async_client.post(
+                reverse('login_async'), {'username': 'alice', 'password': 'x'}, content_type='application/json'
+            )
+        finally:
+            for _ in range(held):
+                slots.release()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+@override_settings(PROFILE_PICTURE_VARIANTS={'small': 32, 'large': 96})
+class ProfilePictureVariantTestCase(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, size=(400, 300), fmt='PNG', name='avatar.png'):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'purple').save(buffer, fmt)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+    def register(self, picture):
+        data = {'username': 'alice', 'password': 'password123', 'email': 'alice@example.com'}
+        data['profile_picture'] = picture
+        response = self.client.post(reverse('register'), data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return User.objects.get(pk=response.data['user']['id']), response
+
+    def test_register_queues_job_and_worker_renders_variants(self):
+        """
+        Registration only queues the work; the worker then writes square JPEG
+        variants that the serializers expose as URLs.
+        """
+        user, response = self.register(self.upload())
+        self.assertEqual(response.data['user']['profile_picture_variants'], {})
+        self.assertTrue(ThumbnailJob.objects.filter(user=user, source=user.profile_picture.name).exists())
+
+        call_command('process_thumbnails', stdout=StringIO())
+        self.assertFalse(ThumbnailJob.objects.exists())
+        user.refresh_from_db()
+        for name, edge in [('small', 32), ('large', 96)]:
+            with default_storage.open(user.profile_picture_variants[name]) as variant:
+                image = Image.open(variant)
+                self.assertEqual((image.format, image.size), ('JPEG', (edge, edge)))
+
+        urls = UserSerializer(user).data['profile_picture_variants']
+        self.assertEqual(set(urls), {'small', 'large'})
+        self.assertTrue(urls['small'].startswith('/media/profile_pics/variants/'))
+
+    def test_replaced_picture_drops_the_stale_job(self):
+        user, _ = self.register(self.upload())
+        User.objects.filter(pk=user.pk).update(profile_picture='profile_pics/other.png')
+        call_command('process_thumbnails', stdout=StringIO())
+        user.refresh_from_db()
+        self.assertEqual(user.profile_picture_variants, {})
+        self.assertFalse(ThumbnailJob.objects.exists())
+
+    def test_failed_job_is_retried_later(self):
+        """
+        A job whose image can't be rendered is rescheduled with its error.
+        """
+        user, _ = self.register(self.upload())
+        with default_storage.open(user.profile_picture.name, 'wb') as original:
+            original.write(b'not an image')
+        self.assertEqual(thumbnails.drain(), 1)
+        job = ThumbnailJob.objects.get()
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('UnidentifiedImageError', job.last_error)
+        self.assertEqual(thumbnails.drain(), 0)
+
+
+class AccountExportTestCase(APITestCase):
+    def setUp(self):
+        """
+        Give a user posts, a comment, a like and a notification, next to
+        another user's rows that must not be exported.
+        """
+        self.user = User.objects.create_user(username='alice', password='password123')
+        self.other = User.objects.create_user(username='bob', password='password123')
+        self.posts = [Post.objects.create(author=self.user, title=f'Post {i}', content='Body') for i in range(5)]
+        other_post = Post.objects.create(author=self.other, title='Other', content='Body')
+        Comment.objects.create(post=other_post, author=self.user, content='Nice')
+        Comment.objects.create(post=self.posts[0], author=self.other, content='Thanks')
+        Like.objects.create(post=other_post, user=self.user)
+        Notification.objects.create(recipient=self.user, actor=self.other, verb='liked your post', target=self.posts[0])
+
+    def parse(self, lines):
+        return [json.loads(line) for line in lines]
+
+    def test_endpoint_streams_the_users_rows_as_ndjson(self):
+        """
+        The export is a streamed NDJSON attachment holding only the user's rows.
+        """
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('account_export'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = self.parse(b''.join(response.streaming_content).decode().splitlines())
+
+        self.assertEqual([r['type'] for r in records], ['account'] + ['post'] * 5 + ['comment', 'like', 'notification'])
+        self.assertEqual([r['id'] for r in records if r['type'] == 'post'], [p.pk for p in self.posts])
+        self.assertEqual(records[-1]['actor_username'], 'bob')
+
+    def test_filename_is_encoded_in_content_disposition(self):
+        self.user.username = 'zoë"; x'
+        self.user.save()
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('account_export'))
+        self.assertEqual(
+            response['Content-Disposition'], "attachment; filename*=utf-8''zo%C3%AB%22%3B%20x-export.ndjson"
+        )
+
+    def test_rows_are_read_in_keyset_chunks(self):
+        """
+        Each table is read chunk_size rows per query, so a bigger export
+        means more small queries rather than one large result.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            list(export.ndjson(self.user, chunk_size=2))
+        post_queries = [q['sql'] for q in queries if 'FROM "posts_post"' in q['sql']]
+        self.assertEqual(len(post_queries), 3)
+        self.assertTrue(all('LIMIT 2' in sql for sql in post_queries))
+
+    def test_command_writes_export(self):
+        out = StringIO()
+        call_command('export_account_data', 'alice', chunk_size=2, stdout=out)
+        records = self.parse(out.getvalue().splitlines())
+        self.assertEqual(len(records), 9)
+        self.assertEqual(records[0]['username'], 'alice')
+
+
+class AccountDeletionTestCase(APITestCase):
+    def setUp(self):
+        """
+        Give alice followers, followees, posts, likes, comments and
+        notifications in both directions.
+        """
+        self.alice = User.objects.create_user(username='alice', password='password123')
+        self.bob = User.objects.create_user(username='bob', password='password123')
+        self.carol = User.objects.create_user(username='carol', password='password123')
+        follows.follow(self.alice, self.bob)
+        follows.follow(self.carol, self.alice)
+
+        self.alice_post = Post.objects.create(author=self.alice, title='Mine', content='Body')
+        timeline.fan_out_post(self.alice_post)
+        self.bob_post = Post.objects.create(author=self.bob, title='Theirs', content='Body')
+        for user, post in [(self.bob, self.alice_post), (self.alice, self.bob_post)]:
+            self.client.force_authenticate(user)
+            self.client.post(reverse('like_post', kwargs={'pk': post.pk}))
+            self.client.post(reverse('comment-list'), {'post': post.pk, 'content': 'Nice'})
+        Notification.objects.create(recipient=self.alice, actor=self.bob, verb='liked your post', target=self.alice_post)
+        Notification.objects.create(recipient=self.bob, actor=self.alice, verb='liked your post', target=self.bob_post)
+        self.token = Token.objects.create(user=self.alice)
+        self.client.force_authenticate(None)
+
+    def test_delete_disables_account_immediately(self):
+        """
+        DELETE /api/accounts/me/ deactivates the user and revokes their token
+        but leaves the purge to the worker.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = self.client.delete(reverse('delete_account'))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        self.alice.refresh_from_db()
+        self.assertFalse(self.alice.is_active)
+        self.assertFalse(Token.objects.filter(user=self.alice).exists())
+        self.assertTrue(Post.objects.filter(author=self.alice).exists())
+        self.assertEqual(AccountDeletion.objects.get(user_id=self.alice.pk).stage, deletion.STAGE_NAMES[0])
+
+        response = self.client.get(reverse('user_feed'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_posts_are_hidden_once_deletion_is_requested(self):
+        """
+        The user's posts leave the public lists, detail, feeds and cached
+        responses as soon as deletion is scheduled, long before their stage.
+        """
+        self.client.get(reverse('post-list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            deletion.schedule(self.alice)
+
+        response = self.client.get(reverse('post-list'))
+        self.assertEqual([post['id'] for post in response.data['results']], [self.bob_post.pk])
+        response = self.client.get(reverse('post-detail', kwargs={'pk': self.alice_post.pk}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.client.force_authenticate(self.carol)
+        self.assertEqual(self.client.get(reverse('user_feed')).data['results'], [])
+
+    def test_deactivated_account_cannot_be_followed_or_unfollowed(self):
+        """
+        Following or unfollowing an account pending deletion is a 404 and
+        leaves its edges for the purge.
+        """
+        deletion.schedule(self.alice)
+        self.client.force_authenticate(self.bob)
+        response = self.client.post(reverse('follow_user', kwargs={'user_id': self.alice.pk}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.client.force_authenticate(self.carol)
+        response = self.client.post(reverse('unfollow_user', kwargs={'user_id': self.alice.pk}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        # Carol's edge to alice is left for the purge; bob gained none
+        self.assertEqual(list(self.alice.followers.values_list('pk', flat=True)), [self.carol.pk])
+
+    def test_thumbnail_jobs_are_purged_first(self):
+        ThumbnailJob.objects.create(user=self.alice, source='profile_pictures/alice.png')
+        deletion.schedule(self.alice)
+        deletion.step(deletion.pending().get())
+        self.assertFalse(ThumbnailJob.objects.filter(user=self.alice).exists())
+        self.assertTrue(User.objects.filter(pk=self.alice.pk).exists())
+
+    def test_batch_expires_cached_posts_once(self):
+        """
+        Deleting a batch of likes bumps the response cache once for the
+        batch (and once after commit), not once per deleted row.
+        """
+        for i in range(3):
+            post = Post.objects.create(author=self.bob, title=f'More {i}', content='Body')
+            Like.objects.create(post=post, user=self.alice)
+        record = deletion.schedule(self.alice)
+        record.stage = 'likes'
+        with mock.patch('posts.response_cache.bump') as bump, self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(deletion.step(record), 4)
+        self.assertEqual(bump.call_count, 2)
+        self.assertEqual(len(bump.call_args.args), 4)
+
+    def test_worker_purges_rows_and_repairs_counters(self):
+        deletion.schedule(self.alice)
+        call_command('purge_deleted_accounts', batch_size=1, pause=0, stdout=StringIO())
+
+        self.assertFalse(User.objects.filter(pk=self.alice.pk).exists())
+        self.assertFalse(Notification.objects.filter(actor_id=self.alice.pk).exists())
+        self.assertFalse(Comment.objects.filter(author_id=self.alice.pk).exists())
+        self.bob_post.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.carol.refresh_from_db()
+        self.assertEqual((self.bob_post.like_count, self.bob_post.comment_count), (0, 0))
+        self.assertEqual((self.bob.follower_count, self.carol.following_count), (0, 0))
+        self.assertNotIn(self.alice.pk, graph.following_ids(self.carol.pk))
+
+        record = AccountDeletion.objects.get(user_id=self.alice.pk)
+        self.assertEqual(record.stage, deletion.DONE)
+        self.assertIsNotNone(record.finished_at)
+        self.assertGreater(record.purged_rows, 0)
+
+    def test_interrupted_purge_resumes_from_saved_progress(self):
+        """
+        Progress is saved per batch, so a fresh worker picks up at the same
+        stage and cursor.
+        """
+        deletion.schedule(self.alice)
+        purge = deletion.purge(deletion.pending().get(), batch_size=1)
+        for _ in range(4):
+            next(purge)
+        record = deletion.pending().get()
+        self.assertNotEqual(record.stage, deletion.STAGE_NAMES[0])
+
+        list(deletion.purge(record, batch_size=1))
+        self.assertFalse(User.objects.filter(pk=self.alice.pk).exists())
+        self.assertFalse(deletion.pending().exists())
@@ -0,0 +1,129 @@
+"""
+Background rendering of profile picture variants.
+
+Uploading a profile picture only queues a ThumbnailJob (`enqueue()`), so
+the request returns without touching the image. The process_thumbnails
+worker calls `drain()`, which renders each entry of
+PROFILE_PICTURE_VARIANTS as a square, centre-cropped, recompressed JPEG and
+records the resulting storage names on `CustomUser.profile_picture_variants`.
+
+Jobs are leased by moving `available_at` forward, so several workers can
+drain the same table. A failed job is retried with a growing delay up to
+THUMBNAIL_JOB_MAX_ATTEMPTS times. A job whose source file has since been
+replaced is dropped. The newer upload has its own job.
+"""
+import os
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import CustomUser, ThumbnailJob
+
+
+def enqueue(user):
+    """Queue rendering of `user`'s current profile picture, if any."""
+    if not user.profile_picture:
+        return None
+    return ThumbnailJob.objects.create(user=user, source=user.profile_picture.name)
+
+
+def variant_urls(user, request=None):
+    """Public URLs of `user`'s rendered variants, keyed by variant name."""
+    urls = {}
+    for name, path in (user.profile_picture_variants or {}).items():
+        url = default_storage.url(path)
+        urls[name] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+def render(source):
+    """Render every variant of the image file `source`; returns {name: JPEG bytes}."""
+    with default_storage.open(source, 'rb') as original:
+        image = Image.open(original)
+        image.draft('RGB', (max(settings.PROFILE_PICTURE_VARIANTS.values()),) * 2)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    rendered = {}
+    for name, size in settings.PROFILE_PICTURE_VARIANTS.items():
+        variant = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        variant.save(
+            buffer, 'JPEG', quality=settings.PROFILE_PICTURE_QUALITY, optimize=True, progressive=True
+        )
+        rendered[name] = buffer.getvalue()
+    return rendered
+
+
+def process(job):
+    """Render and attach the variants of one job. Returns False if the job is obsolete."""
+    stem, _ = os.path.splitext(os.path.basename(job.source))
+    rendered = render(job.source)
+    saved = {
+        name: default_storage.save(f'profile_pics/variants/{stem}_{name}.jpg', ContentFile(data))
+        for name, data in rendered.items()
+    }
+
+    with transaction.atomic():
+        user = CustomUser.objects.select_for_update().filter(pk=job.user_id).first()
+        current = user is not None and user.profile_picture.name == job.source
+        if current:
+            previous = user.profile_picture_variants or {}
+            user.profile_picture_variants = saved
+            # save() rather than update() so cached copies of the user are dropped
+            user.save(update_fields=['profile_picture_variants'])
+
+    if not current:
+        for path in saved.values():
+            default_storage.delete(path)
+        return False
+    for path in previous.values():
+        if path not in saved.values():
+            default_storage.delete(path)
+    return True
+
+
+def _claim(now):
+    """Lease the oldest available job, or return None if there is none."""
+    lease = timedelta(seconds=settings.THUMBNAIL_JOB_LEASE)
+    while True:
+        job = ThumbnailJob.objects.filter(available_at__lte=now).order_by('available_at', 'pk').first()
+        if job is None:
+            return None
+        claimed = ThumbnailJob.objects.filter(pk=job.pk, available_at=job.available_at).update(
+            available_at=now + lease, attempts=F('attempts') + 1
+        )
+        if claimed:
+            job.attempts += 1
+            return job
+
+
+def drain(batch_size=20):
+    """
+    Process up to `batch_size` available jobs. Returns the number of jobs
+    handled (including failures), so callers can loop until it returns 0.
+    """
+    handled = 0
+    while handled < batch_size:
+        now = timezone.now()
+        job = _claim(now)
+        if job is None:
+            break
+        handled += 1
+        try:
+            process(job)
+        except Exception as exc:
+            if job.attempts >= settings.THUMBNAIL_JOB_MAX_ATTEMPTS:
+                job.delete()
+            else:
+                retry_at = now + timedelta(seconds=2 ** job.attempts)
+                ThumbnailJob.objects.filter(pk=job.pk).update(available_at=retry_at, last_error=repr(exc))
+            continue
+        job.delete()
+    return handled
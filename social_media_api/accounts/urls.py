@@ -1,9 +1,22 @@
 from django.urls import path
-from .views import register_user, login_user, FollowUserView, UnfollowUserView
+from .views import (
+    register_user, login_user, register_user_async, login_user_async, FollowUserView, BulkFollowView, UnfollowUserView, RelationshipView,
+    BulkUnfollowView, FollowersListView, FollowingListView, FollowSuggestionsView, ExportAccountView, DeleteAccountView,
+)
 
 urlpatterns = [
     path('register/', register_user, name='register'),
     path('login/', login_user, name='login'),
+    path('register/async/', register_user_async, name='register_async'),
+    path('login/async/', login_user_async, name='login_async'),
+    path('follow/bulk/', BulkFollowView.as_view(), name='bulk_follow'),
     path('follow/<int:user_id>/', FollowUserView.as_view(), name='follow_user'),
+    path('unfollow/bulk/', BulkUnfollowView.as_view(), name='bulk_unfollow'),
     path('unfollow/<int:user_id>/', UnfollowUserView.as_view(), name='unfollow_user'),
+    path('suggestions/', FollowSuggestionsView.as_view(), name='follow_suggestions'),
+    path('export/', ExportAccountView.as_view(), name='account_export'),
+    path('me/', DeleteAccountView.as_view(), name='delete_account'),
+    path('<int:user_id>/relationship/', RelationshipView.as_view(), name='user_relationship'),
+    path('<int:user_id>/followers/', FollowersListView.as_view(), name='user_followers'),
+    path('<int:user_id>/following/', FollowingListView.as_view(), name='user_following'),
 ]
\ No newline at end of file
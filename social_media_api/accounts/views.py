@@ -1,12 +1,24 @@
+import json
+
+from asgiref.sync import sync_to_async
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from rest_framework.authtoken.models import Token
-from django.contrib.auth import authenticate
+from django.conf import settings
+from django.contrib.auth import authenticate, user_logged_in
 from django.core.exceptions import ObjectDoesNotExist
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework import generics, permissions
-from .models import CustomUser  
-from .serializers import RegisterSerializer, UserSerializer
+from social_media_api.pagination import KeysetPagination
+from .models import CustomUser, Follow, FollowSuggestion
+from .serializers import (
+    RegisterSerializer, UserSerializer, UserSummarySerializer, FollowSuggestionSerializer, BulkFollowSerializer,
+)
+from . import deletion, export, follows, graph, hashing
 
 @api_view(['POST'])
 def register_user(request):
@@ -30,6 +42,8 @@ def login_user(request):
         user = authenticate(username=username, password=password)
         
         if user:
+            # Records last_login through django.contrib.auth's receiver
+            user_logged_in.send(sender=user.__class__, request=request, user=user)
             token, created = Token.objects.get_or_create(user=user)
             return Response({
                 'token': token.key,
@@ -38,25 +52,259 @@ def login_user(request):
         
         return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
+# Async versions of register_user/login_user for ASGI deployments. Password
+# hashing runs on the bounded accounts.hashing pool; when it is saturated the
+# request is turned away with 503 and Retry-After instead of piling up.
+
+def _request_data(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    data = request.POST.dict()
+    data.update(request.FILES.dict())
+    return data
+
+def _hashing_saturated():
+    response = JsonResponse(
+        {'error': 'Too many concurrent sign-ins, please retry shortly.'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+    response['Retry-After'] = str(settings.PASSWORD_HASHING_RETRY_AFTER)
+    return response
+
+@csrf_exempt
+@require_POST
+async def register_user_async(request):
+    data = _request_data(request)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Malformed request body'}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = RegisterSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        password_hash = await hashing.amake_password(serializer.validated_data['password'])
+    except hashing.HashingPoolSaturated:
+        return _hashing_saturated()
+
+    user = await sync_to_async(serializer.save)(password_hash=password_hash)
+    token = await Token.objects.aget(user=user)
+    user_data = await sync_to_async(lambda: UserSerializer(user).data)()
+    return JsonResponse({'token': token.key, 'user': user_data}, status=status.HTTP_201_CREATED)
+
+@csrf_exempt
+@require_POST
+async def login_user_async(request):
+    data = _request_data(request)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Malformed request body'}, status=status.HTTP_400_BAD_REQUEST)
+    username = data.get('username')
+    password = data.get('password')
+    if not username or not password:
+        return JsonResponse({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    user = await CustomUser.objects.filter(**{CustomUser.USERNAME_FIELD: username}).afirst()
+    outdated = []
+    try:
+        if user is None or not user.is_active:
+            # Hash anyway, like ModelBackend, so unknown usernames cannot be
+            # told apart by response time
+            await hashing.amake_password(password)
+            valid = False
+        else:
+            valid = await hashing.acheck_password(password, user.password, setter=outdated.append)
+        if valid and outdated:
+            # Re-hash with the current hasher settings, as User.check_password does
+            user.password = await hashing.amake_password(password)
+            await user.asave(update_fields=['password'])
+    except hashing.HashingPoolSaturated:
+        return _hashing_saturated()
+
+    if not valid:
+        return JsonResponse({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    await sync_to_async(user_logged_in.send)(sender=user.__class__, request=request, user=user)
+
+    token, _ = await Token.objects.aget_or_create(user=user)
+    user_data = await sync_to_async(lambda: UserSerializer(user).data)()
+    return JsonResponse({'token': token.key, 'user': user_data}, status=status.HTTP_200_OK)
+
 class FollowUserView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
-    queryset = CustomUser.objects.all()
+    # Accounts pending deletion can't gain or lose followers
+    queryset = CustomUser.objects.filter(is_active=True)
+    lookup_url_kwarg = 'user_id'
 
-    def post(self, request, pk):
+    def post(self, request, user_id):
         user_to_follow = self.get_object()
         
         if user_to_follow == request.user:
             return Response({"error": "You cannot follow yourself."}, status=status.HTTP_400_BAD_REQUEST)
 
-        request.user.following.add(user_to_follow)
+        follows.follow(request.user, user_to_follow)
         return Response({"message": f"You are now following {user_to_follow.username}"}, status=status.HTTP_200_OK)
 
+class BulkFollowView(generics.GenericAPIView):
+    """
+    POST /api/accounts/follow/bulk/ {"user_ids": [...]}
+    - Follow many accounts at once, e.g. during onboarding or a contact
+      import. IDs that do not exist (or are yourself) are reported back.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = BulkFollowSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        requested = serializer.validated_data['user_ids']
+
+        found, created = follows.follow_many(request.user, requested)
+        return Response({
+            'followed': created,
+            'already_following': sorted(found.difference(created)),
+            'not_found': sorted(set(requested) - found),
+        }, status=status.HTTP_200_OK)
+
+class BulkUnfollowView(generics.GenericAPIView):
+    """
+    POST /api/accounts/unfollow/bulk/ {"user_ids": [...]}
+    - Unfollow many accounts at once. IDs you were not following are
+      reported back.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = BulkFollowSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        requested = serializer.validated_data['user_ids']
+
+        removed = follows.unfollow_many(request.user, requested)
+        return Response({
+            'unfollowed': removed,
+            'not_following': sorted(set(requested).difference(removed)),
+        }, status=status.HTTP_200_OK)
+
 class UnfollowUserView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
-    queryset = CustomUser.objects.all()
+    # Accounts pending deletion can't gain or lose followers
+    queryset = CustomUser.objects.filter(is_active=True)
+    lookup_url_kwarg = 'user_id'
 
-    def post(self, request, pk):
+    def post(self, request, user_id):
         user_to_unfollow = self.get_object()
         
-        request.user.following.remove(user_to_unfollow)
-        return Response({"message": f"You have unfollowed {user_to_unfollow.username}"}, status=status.HTTP_200_OK)
\ No newline at end of file
+        follows.unfollow(request.user, user_to_unfollow)
+        return Response({"message": f"You have unfollowed {user_to_unfollow.username}"}, status=status.HTTP_200_OK)
+
+class RelationshipView(generics.GenericAPIView):
+    """
+    GET /api/accounts/<user_id>/relationship/
+    - Whether the current user follows <user_id>, whether they follow back,
+      and how many accounts both of them follow. Answered from the cached
+      follow graph index.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, user_id):
+        return Response({
+            'following': graph.is_following(request.user.pk, user_id),
+            'followed_by': graph.is_following(user_id, request.user.pk),
+            'common_following_count': len(graph.common_following(request.user.pk, user_id)),
+        }, status=status.HTTP_200_OK)
+
+class FollowPagination(KeysetPagination):
+    # Most recent follows first; the through table's id is the keyset
+    ordering = ('-id',)
+
+class FollowListView(generics.GenericAPIView):
+    """
+    Page through one side of a user's follow relationships.
+
+    Walks the followers through table by its own primary key and joins only
+    the projected user columns, so a page costs one indexed range scan no
+    matter how many followers the account has.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = UserSummarySerializer
+    pagination_class = FollowPagination
+    # Through-table column holding the listed user, and the one to filter on
+    user_field = None
+    owner_field = None
+
+    def get(self, request, user_id):
+        generics.get_object_or_404(CustomUser.objects.only('pk'), pk=user_id)
+        edges = (
+            Follow.objects.filter(**{f'{self.owner_field}_id': user_id})
+            .select_related(self.user_field)
+            .only('id', *(f'{self.user_field}__{field}' for field in UserSummarySerializer.Meta.fields))
+        )
+        page = self.paginate_queryset(edges)
+        serializer = self.get_serializer([getattr(edge, self.user_field) for edge in page], many=True)
+        return self.get_paginated_response(serializer.data)
+
+class FollowersListView(FollowListView):
+    """
+    GET /api/accounts/<user_id>/followers/
+    - Accounts following <user_id>, most recent first, cursor paginated.
+    """
+    owner_field = 'from_customuser'
+    user_field = 'to_customuser'
+
+class FollowingListView(FollowListView):
+    """
+    GET /api/accounts/<user_id>/following/
+    - Accounts <user_id> follows, most recent first, cursor paginated.
+    """
+    owner_field = 'to_customuser'
+    user_field = 'from_customuser'
+
+
+class FollowSuggestionsView(generics.GenericAPIView):
+    """
+    GET /api/accounts/suggestions/
+    - "People you may know", ranked by how many accounts the current user
+      follows also follow them. Reads the rows precomputed by
+      compute_follow_suggestions; accounts followed since then are skipped.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = FollowSuggestionSerializer
+
+    def get(self, request):
+        suggestions = (
+            FollowSuggestion.objects.filter(user=request.user)
+            .select_related('suggested')
+            .order_by('-score', 'suggested_id')
+        )
+        following = graph.following_ids(request.user.pk)
+        suggestions = [s for s in suggestions if not graph.contains(following, s.suggested_id)]
+        return Response(self.get_serializer(suggestions, many=True).data, status=status.HTTP_200_OK)
+
+class ExportAccountView(generics.GenericAPIView):
+    """
+    GET /api/accounts/export/
+    - Everything the current user has posted, commented, liked and been
+      notified about, streamed as NDJSON (one record per line).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        response = StreamingHttpResponse(export.ndjson(request.user), content_type='application/x-ndjson')
+        response['Content-Disposition'] = content_disposition_header(True, f'{request.user.username}-export.ndjson')
+        return response
+
+
+class DeleteAccountView(generics.GenericAPIView):
+    """
+    DELETE /api/accounts/me/
+    - Deactivate the current account and revoke its token at once. Its data
+      is purged in the background by purge_deleted_accounts.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def delete(self, request):
+        deletion.schedule(request.user)
+        return Response({'detail': 'Account scheduled for deletion.'}, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,130 @@
+"""
+Pub/sub that wakes up a user's open notification streams.
+
+`outbox.drain()` publishes the ID of every notification it creates or
+coalesces once its transaction commits, usually from the separate
+`process_notifications` worker. Publishing appends the ID to a per-user log
+in the shared cache: a counter (the log's position) is incremented and the
+ID stored under the new position for NOTIFICATION_STREAM_LOG_TTL seconds.
+
+Each stream opened by `notifications.views.notification_stream` subscribes an
+asyncio queue for its user, remembers the log position, and reads the IDs
+published since then with `updates()` every NOTIFICATION_STREAM_POLL_INTERVAL
+seconds, which costs a cache read rather than a query. A publish from the
+same process also wakes its streams at once through their queues. A stream
+only reads the database when the log has IDs for it, or when `updates()`
+reports that it lost track (the log was evicted or the stream fell behind).
+"""
+import asyncio
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Sentinel telling a stream to close because the user opened too many
+CLOSE = object()
+
+_subscribers = defaultdict(list)
+_lock = threading.Lock()
+
+
+def subscribe(user_id):
+    """
+    Register a queue on the running event loop that is woken when
+    `user_id` gets a notification published in this process. The oldest
+    stream of a user beyond NOTIFICATION_STREAM_MAX_CONNECTIONS is told to
+    close.
+    """
+    queue = asyncio.Queue(maxsize=settings.NOTIFICATION_STREAM_QUEUE_SIZE)
+    loop = asyncio.get_running_loop()
+    with _lock:
+        subscribers = _subscribers[user_id]
+        subscribers.append((loop, queue))
+        evicted = subscribers[:-settings.NOTIFICATION_STREAM_MAX_CONNECTIONS]
+        del subscribers[:-settings.NOTIFICATION_STREAM_MAX_CONNECTIONS]
+    for old_loop, old_queue in evicted:
+        old_loop.call_soon_threadsafe(_put, old_queue, CLOSE)
+    return queue
+
+
+def unsubscribe(user_id, queue):
+    with _lock:
+        subscribers = _subscribers.get(user_id, [])
+        subscribers[:] = [entry for entry in subscribers if entry[1] is not queue]
+        if not subscribers:
+            _subscribers.pop(user_id, None)
+
+
+def _position_key(user_id):
+    return f'notifications:stream:{user_id}'
+
+
+def position(user_id):
+    """Current position of `user_id`'s log; pass it to `updates()` later."""
+    key = _position_key(user_id)
+    value = cache.get(key)
+    if value is None:
+        # Never restart at a position an open stream may already be past
+        cache.add(key, time.time_ns(), None)
+        value = cache.get(key)
+    return value
+
+
+def updates(user_id, since):
+    """
+    Notification IDs published for `user_id` after position `since`, as
+    (new position, IDs). IDs is None when the stream fell more than
+    NOTIFICATION_STREAM_QUEUE_SIZE entries behind or the log was reset; the
+    stream then just reloads its newest rows.
+    """
+    current = position(user_id)
+    if current == since:
+        return since, []
+    if not since < current <= since + settings.NOTIFICATION_STREAM_QUEUE_SIZE:
+        return current, None
+    seqs = range(since + 1, current + 1)
+    found = cache.get_many([f'{_position_key(user_id)}:{seq}' for seq in seqs])
+    ids = []
+    for seq in seqs:
+        notification_id = found.get(f'{_position_key(user_id)}:{seq}')
+        if notification_id is None and seq > since + 1:
+            # Its publisher has incremented the position but not stored the
+            # ID yet; read from here again next time, and skip it if still missing
+            return seq - 1, ids
+        if notification_id is not None:
+            ids.append(notification_id)
+    return current, ids
+
+
+def publish(user_id, notification_id):
+    """
+    Log `notification_id` for `user_id`'s streams in every process and wake
+    those in this one. Safe to call from any thread.
+    """
+    key = _position_key(user_id)
+    try:
+        seq = cache.incr(key)
+    except ValueError:
+        position(user_id)
+        seq = cache.incr(key)
+    cache.set(f'{key}:{seq}', notification_id, settings.NOTIFICATION_STREAM_LOG_TTL)
+    with _lock:
+        subscribers = list(_subscribers.get(user_id, ()))
+    for loop, queue in subscribers:
+        try:
+            loop.call_soon_threadsafe(_put, queue, notification_id)
+        except RuntimeError:
+            # The stream's event loop has shut down
+            pass
+
+
+def _put(queue, item):
+    if item is CLOSE and queue.full():
+        queue.get_nowait()
+    try:
+        queue.put_nowait(item)
+    except asyncio.QueueFull:
+        # The stream already has a wake-up pending
+        pass
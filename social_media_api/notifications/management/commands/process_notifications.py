@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications import outbox
+
+
+class Command(BaseCommand):
+    help = "Drain the notification outbox, coalescing bursts into aggregated notifications."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Maximum number of events processed per transaction (default: 500).",
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep running and poll for new events instead of exiting once the outbox is empty.",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help="Seconds to sleep between polls of an empty outbox with --loop (default: 1).",
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            drained = outbox.drain(options['batch_size'])
+            processed += drained
+            if drained:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} notification event(s)."))
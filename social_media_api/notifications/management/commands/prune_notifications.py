@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from notifications import retention
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete or archive read notifications older than NOTIFICATION_RETENTION_DAYS, "
+        "in small primary-key batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archive', action='store_true',
+            help="Move expired notifications to NotificationArchive instead of deleting them.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Size of the primary-key range handled per transaction (default: 1000).",
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help="Seconds to sleep between batches so other writers can get the lock (default: 0.05).",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for handled in retention.prune(options['batch_size'], options['archive'], options['pause']):
+            total += handled
+            self.stdout.write(f"  {total} notification(s) so far")
+
+        action = 'Archived' if options['archive'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f"{action} {total} expired notification(s)."))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_latest_actors(apps, schema_editor):
+    # Earlier coalesced rows only remember their latest actor, so once such
+    # a row changes again its count covers that actor and the new ones
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationActor = apps.get_model('notifications', 'NotificationActor')
+    rows = Notification.objects.values_list('pk', 'actor_id', 'timestamp').iterator(chunk_size=1000)
+    batch = []
+    for pk, actor_id, timestamp in rows:
+        batch.append(NotificationActor(notification_id=pk, actor_id=actor_id, acted_at=timestamp))
+        if len(batch) >= 1000:
+            NotificationActor.objects.bulk_create(batch)
+            batch = []
+    NotificationActor.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_notificationarchive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationevent',
+            name='undo',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='NotificationActor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('acted_at', models.DateTimeField()),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actors', to='notifications.notification')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['notification', '-acted_at'], name='notif_actor_acted_idx')],
+                'constraints': [models.UniqueConstraint(fields=('notification', 'actor'), name='unique_notification_actor')],
+            },
+        ),
+        migrations.RunPython(record_latest_actors, migrations.RunPython.noop),
+    ]
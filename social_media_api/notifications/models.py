@@ -2,6 +2,23 @@ from django.db import models
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from posts.models import Comment, Post
+
+class NotificationQuerySet(models.QuerySet):
+    def with_related(self):
+        """
+        Load actors with a join and resolve `target` in batches: the
+        notifications are grouped by content type and each target table is
+        read with one IN query, so a page costs the same number of queries
+        whatever its size.
+        """
+        return self.select_related('actor').prefetch_related(
+            GenericPrefetch('target', [
+                Post.objects.all(),
+                Comment.objects.select_related('author', 'post'),
+            ])
+        )
 
 class Notification(models.Model):
     recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
@@ -15,5 +32,96 @@ class Notification(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     read = models.BooleanField(default=False)
 
+    # Bursts of the same verb on the same target are coalesced into a single
+    # notification: `actor` is the most recent actor and `actor_count` how
+    # many distinct actors it stands for (its NotificationActor rows).
+    actor_count = models.PositiveIntegerField(default=1)
+
+    objects = NotificationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', '-timestamp', '-id'], name='notif_recipient_ts_id_idx'),
+            models.Index(fields=['recipient', 'read', '-timestamp'], name='notif_recipient_read_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.actor} {self.verb} {self.target}"
+
+    @property
+    def summary(self):
+        """e.g. "alice and 41 others liked your post"."""
+        others = self.actor_count - 1
+        if others <= 0:
+            return f"{self.actor} {self.verb}"
+        return f"{self.actor} and {others} other{'s' if others > 1 else ''} {self.verb}"
+
+
+class NotificationActor(models.Model):
+    """
+    One distinct actor folded into a coalesced Notification. `outbox.drain()`
+    adds a row per actor and removes it when the action is undone, then
+    derives the notification's `actor`, `actor_count` and `timestamp` from
+    the remaining rows, so repeats never count twice.
+    """
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='actors')
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    acted_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'actor'], name='unique_notification_actor'),
+        ]
+        indexes = [
+            models.Index(fields=['notification', '-acted_at'], name='notif_actor_acted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.actor} in {self.notification}"
+
+
+class NotificationEvent(models.Model):
+    """
+    Outbox row for a notification that has not been delivered yet.
+
+    Views only append here, inside the transaction of the write that caused
+    the event. The `process_notifications` worker drains the outbox and
+    coalesces events into Notification rows.
+    """
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    verb = models.CharField(max_length=255)
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    object_id = models.PositiveIntegerField()
+    target = GenericForeignKey('content_type', 'object_id')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Set when the actor took the action back (e.g. unliked), which
+    # retracts them from the notification instead of adding them
+    undo = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.actor} {self.verb} {self.target} ({'undo' if self.undo else 'pending'})"
+
+
+class NotificationArchive(models.Model):
+    """
+    Read notifications moved out of the hot Notification table by
+    `prune_notifications --archive` once their retention period is over.
+    """
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    verb = models.CharField(max_length=255)
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    object_id = models.PositiveIntegerField()
+    target = GenericForeignKey('content_type', 'object_id')
+
+    actor_count = models.PositiveIntegerField(default=1)
+    timestamp = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
     def __str__(self):
-        return f"{self.actor} {self.verb} {self.target}"
\ No newline at end of file
+        return f"{self.actor} {self.verb} {self.target} (archived)"
@@ -0,0 +1,143 @@
+"""
+DB-backed outbox for notifications.
+
+Request handlers call `enqueue()`, which only appends a NotificationEvent row
+inside the caller's transaction. The `process_notifications` worker then
+calls `drain()`, which turns the pending events into Notification rows.
+Events with the same (recipient, verb, target) are merged into the
+recipient's most recent unread notification for that target if it is younger
+than NOTIFICATION_COALESCE_WINDOW seconds. A like storm on a popular post
+therefore ends up as one "alice and 41 others liked your post" row instead of
+one row per like.
+
+Each notification keeps its distinct actors as NotificationActor rows and its
+`actor_count` is derived from them, so an actor who likes, unlikes and likes
+again is counted once. An `undo` event (the unlike) removes the actor from
+the recipient's unread notifications for that target again; a notification
+left without actors is deleted.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+
+from . import broker, unread
+from .models import Notification, NotificationActor, NotificationEvent
+
+
+def enqueue(recipient_id, actor_id, verb, target, undo=False):
+    """
+    Record that `actor_id` did `verb` to `target` (or, with `undo`, took it
+    back), to be delivered to `recipient_id`.
+    """
+    return NotificationEvent.objects.create(
+        recipient_id=recipient_id,
+        actor_id=actor_id,
+        verb=verb,
+        content_type=ContentType.objects.get_for_model(target),
+        object_id=target.pk,
+        undo=undo,
+    )
+
+
+def refresh(notification_ids):
+    """
+    Re-derive `actor`, `actor_count` and `timestamp` of each notification
+    from its NotificationActor rows, deleting those left without actors.
+    Returns {notification id: recipient id} of the deleted unread ones.
+    """
+    emptied = {}
+    for pk in notification_ids:
+        actors = NotificationActor.objects.filter(notification_id=pk)
+        latest = actors.order_by('-acted_at', '-pk').values('actor_id', 'acted_at').first()
+        if latest is None:
+            row = Notification.objects.filter(pk=pk).values('recipient_id', 'read').first()
+            if row is not None:
+                Notification.objects.filter(pk=pk).delete()
+                if not row['read']:
+                    emptied[pk] = row['recipient_id']
+            continue
+        Notification.objects.filter(pk=pk).update(
+            actor_id=latest['actor_id'],
+            actor_count=actors.count(),
+            timestamp=latest['acted_at'],
+        )
+    return emptied
+
+
+def drain(batch_size=500):
+    """
+    Deliver up to `batch_size` pending events, oldest first. Returns the
+    number of events processed, so callers can loop until it returns 0.
+    """
+    with transaction.atomic():
+        events = list(
+            NotificationEvent.objects.select_for_update(skip_locked=True).order_by('pk')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        groups = {}
+        for event in events:
+            key = (event.recipient_id, event.verb, event.content_type_id, event.object_id)
+            # Only each actor's last event in the batch counts
+            group = groups.setdefault(key, {})
+            group.pop(event.actor_id, None)
+            group[event.actor_id] = event
+
+        window_start = timezone.now() - timedelta(seconds=settings.NOTIFICATION_COALESCE_WINDOW)
+        for (recipient_id, verb, content_type_id, object_id), group in groups.items():
+            unread_rows = Notification.objects.filter(
+                recipient_id=recipient_id,
+                verb=verb,
+                content_type_id=content_type_id,
+                object_id=object_id,
+                read=False,
+            )
+            added = [event for event in group.values() if not event.undo]
+            retracted = [actor_id for actor_id, event in group.items() if event.undo]
+            touched = set()
+
+            if retracted:
+                undone = NotificationActor.objects.filter(notification__in=unread_rows, actor_id__in=retracted)
+                touched.update(undone.values_list('notification_id', flat=True))
+                undone.delete()
+
+            if added:
+                existing = (
+                    unread_rows.filter(timestamp__gte=window_start)
+                    .order_by('-timestamp')
+                    .values_list('pk', flat=True)
+                    .first()
+                )
+                if existing is None:
+                    existing = Notification.objects.create(
+                        recipient_id=recipient_id,
+                        actor_id=added[-1].actor_id,
+                        verb=verb,
+                        content_type_id=content_type_id,
+                        object_id=object_id,
+                    ).pk
+                    transaction.on_commit(lambda user_id=recipient_id: unread.increment(user_id))
+                NotificationActor.objects.bulk_create(
+                    [
+                        NotificationActor(notification_id=existing, actor_id=event.actor_id, acted_at=event.created_at)
+                        for event in added
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['notification', 'actor'],
+                    update_fields=['acted_at'],
+                )
+                touched.add(existing)
+
+            emptied = refresh(sorted(touched))
+            for pk in touched:
+                if pk in emptied:
+                    transaction.on_commit(lambda user_id=recipient_id: unread.increment(user_id, -1))
+                else:
+                    transaction.on_commit(lambda user_id=recipient_id, pk=pk: broker.publish(user_id, pk))
+
+        NotificationEvent.objects.filter(pk__in=[event.pk for event in events]).delete()
+    return len(events)
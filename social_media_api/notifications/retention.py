@@ -0,0 +1,74 @@
+"""
+Retention policy for read notifications.
+
+Expired rows are removed in primary-key ranges of at most `batch_size` ids,
+each in its own short transaction, so the job never holds SQLite's write lock
+for long and request handlers can interleave between batches.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .models import Notification, NotificationArchive
+
+ARCHIVED_FIELDS = [
+    'recipient_id', 'actor_id', 'verb', 'content_type_id', 'object_id', 'actor_count', 'timestamp',
+]
+
+
+def expired(now=None):
+    """
+    Q matching read notifications older than NOTIFICATION_RETENTION_DAYS
+    allows for their verb, or None if the policy keeps everything.
+    """
+    now = now or timezone.now()
+    policy = dict(settings.NOTIFICATION_RETENTION_DAYS)
+    default_days = policy.pop('default', None)
+
+    condition = Q()
+    for verb, days in policy.items():
+        if days is not None:
+            condition |= Q(verb=verb, timestamp__lt=now - timedelta(days=days))
+    if default_days is not None:
+        condition |= Q(timestamp__lt=now - timedelta(days=default_days)) & ~Q(verb__in=list(policy))
+
+    if not condition:
+        return None
+    return Q(read=True) & condition
+
+
+def prune(batch_size=1000, archive=False, pause=0, now=None):
+    """
+    Delete (or, with `archive`, move to NotificationArchive) every expired
+    notification. Yields the number of rows handled by each batch.
+    """
+    condition = expired(now)
+    if condition is None:
+        return
+
+    candidates = Notification.objects.filter(condition)
+    bounds = candidates.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return
+
+    start = bounds['low']
+    while start <= bounds['high']:
+        batch = candidates.filter(pk__gte=start, pk__lt=start + batch_size)
+        with transaction.atomic():
+            if archive:
+                NotificationArchive.objects.bulk_create(
+                    NotificationArchive(**row) for row in batch.values(*ARCHIVED_FIELDS)
+                )
+            # Count only notifications, not the NotificationActor rows that cascade
+            _, deleted = batch.delete()
+        handled = deleted.get(Notification._meta.label, 0)
+        start += batch_size
+
+        if handled:
+            yield handled
+            if pause:
+                time.sleep(pause)
@@ -5,7 +5,11 @@ from django.contrib.auth import get_user_model
 class NotificationSerializer(serializers.ModelSerializer):
     actor = serializers.ReadOnlyField(source='actor.username')
     target = serializers.StringRelatedField() 
+    summary = serializers.ReadOnlyField()
 
     class Meta:
         model = Notification
-        fields = ['id', 'actor', 'verb', 'target', 'timestamp', 'read']
\ No newline at end of file
+        fields = ['id', 'actor', 'actor_count', 'summary', 'verb', 'target', 'timestamp', 'read']
+
+class MarkReadSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
\ No newline at end of file
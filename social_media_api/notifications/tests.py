@@ -1,3 +1,377 @@
-from django.test import TestCase
+import asyncio
+from collections import defaultdict
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from posts.models import Comment, Post
+from . import broker, outbox, views
+from .models import Notification, NotificationActor, NotificationArchive, NotificationEvent
+
+User = get_user_model()
+
+
+class NotificationOutboxTestCase(APITestCase):
+    def setUp(self):
+        """
+        Set up an author with a post and a few users who will like it.
+        """
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+        self.likers = [User.objects.create_user(username=name, password='password123') for name in ('alice', 'bob', 'carol')]
+
+    def like(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.post(reverse('like_post', kwargs={'pk': self.post.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def unlike(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.post(reverse('unlike_post', kwargs={'pk': self.post.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def drain(self):
+        call_command('process_notifications', stdout=StringIO())
+
+    def test_like_is_queued_not_delivered_inline(self):
+        self.like(self.likers[0])
+        self.assertEqual(NotificationEvent.objects.count(), 1)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_burst_is_coalesced_into_one_notification(self):
+        """
+        Several likes on the same post end up as a single aggregated row.
+        """
+        for user in self.likers[:2]:
+            self.like(user)
+        self.drain()
+        self.like(self.likers[2])
+        self.drain()
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.recipient, self.author)
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(notification.summary, 'carol and 2 others liked your post')
+        self.assertFalse(NotificationEvent.objects.exists())
+
+    def test_relike_across_batches_counts_the_actor_once(self):
+        """
+        Liking, unliking and liking again is still one actor, however the
+        events are split into batches.
+        """
+        alice, bob = self.likers[:2]
+        self.like(alice)
+        self.like(bob)
+        self.drain()
+        self.unlike(alice)
+        self.drain()
+        self.like(alice)
+        self.drain()
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.summary, 'alice and 1 other liked your post')
+
+    def test_unlike_retracts_the_actor(self):
+        """
+        Undoing a like removes the actor; the notification goes away with its
+        last actor, together with its unread badge.
+        """
+        alice, bob = self.likers[:2]
+        self.like(alice)
+        self.like(bob)
+        self.drain()
+        self.unlike(bob)
+        self.drain()
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 1)
+        self.assertEqual(notification.summary, 'alice liked your post')
+
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.client.get(reverse('notifications_unread_count')).data['unread_count'], 1)
+        self.unlike(alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.drain()
+        self.assertFalse(Notification.objects.exists())
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.client.get(reverse('notifications_unread_count')).data['unread_count'], 0)
+
+    def test_like_and_unlike_in_one_batch_cancel_out(self):
+        self.like(self.likers[0])
+        self.unlike(self.likers[0])
+        self.drain()
+        self.assertFalse(Notification.objects.exists())
+
+    def test_read_notifications_are_not_reused(self):
+        self.like(self.likers[0])
+        self.drain()
+        Notification.objects.update(read=True)
+        self.like(self.likers[1])
+        self.drain()
+        self.assertEqual(Notification.objects.count(), 2)
+
+
+class NotificationListQueryTestCase(APITestCase):
+    def setUp(self):
+        """
+        Give one recipient notifications about posts and comments from many actors.
+        """
+        self.recipient = User.objects.create_user(username='recipient', password='password123')
+        self.actors = [User.objects.create_user(username=f'actor{i}', password='password123') for i in range(3)]
+        for i in range(60):
+            actor = self.actors[i % 3]
+            post = Post.objects.create(author=self.recipient, title=f'Post {i}', content='Body')
+            comment = Comment.objects.create(post=post, author=actor, content='Nice')
+            Notification.objects.create(recipient=self.recipient, actor=actor, verb='liked your post', target=post)
+            Notification.objects.create(recipient=self.recipient, actor=actor, verb='commented', target=comment)
+        # Content types are cached per process; warm the cache so counts are stable
+        ContentType.objects.get_for_models(Post, Comment)
+        self.client.force_authenticate(self.recipient)
+
+    def test_page_runs_fixed_number_of_queries(self):
+        """
+        One query for the page (actors joined) plus one per target type,
+        whatever the page size: NotificationSerializer must not query per row.
+        """
+        for page_size in (1, 20, 100):
+            with self.subTest(page_size=page_size):
+                with self.assertNumQueries(3):
+                    response = self.client.get(reverse('notifications_list') + f'?page_size={page_size}')
+                self.assertEqual(len(response.data['results']), page_size)
+        self.assertEqual(response.data['results'][0]['target'], 'Comment by actor2 on Post 59')
+
+
+class UnreadNotificationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.reader = User.objects.create_user(username='reader', password='password123')
+        self.posts = [Post.objects.create(author=self.author, title=f'Post {i}', content='Body') for i in range(3)]
+        self.client.force_authenticate(self.author)
+
+    def unread_count(self):
+        return self.client.get(reverse('notifications_unread_count')).data['unread_count']
+
+    def notify(self, post):
+        outbox.enqueue(self.author.pk, self.reader.pk, 'liked your post', post)
+        outbox.drain()
+
+    def test_unread_count_is_cached_and_incremented(self):
+        """
+        The badge count is served from cache and follows new notifications.
+        """
+        self.assertEqual(self.unread_count(), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread_count(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.notify(self.posts[0])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread_count(), 1)
+
+    def test_mark_read_and_mark_all_read(self):
+        for post in self.posts:
+            self.notify(post)
+        first = Notification.objects.order_by('pk').first()
+
+        response = self.client.post(reverse('notifications_mark_read'), {'ids': [first.pk]}, format='json')
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(self.unread_count(), 2)
+
+        response = self.client.post(reverse('notifications_mark_all_read'))
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(self.unread_count(), 0)
+
+    def test_mark_read_ignores_other_users_notifications(self):
+        self.notify(self.posts[0])
+        self.client.force_authenticate(self.reader)
+        response = self.client.post(
+            reverse('notifications_mark_read'), {'ids': [Notification.objects.get().pk]}, format='json'
+        )
+        self.assertEqual(response.data['updated'], 0)
+        self.assertFalse(Notification.objects.get().read)
+
+    def test_mark_read_requires_ids(self):
+        response = self.client.post(reverse('notifications_mark_read'), {'ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(NOTIFICATION_RETENTION_DAYS={'default': 90, 'liked your post': 30, 'mentioned you': None})
+class NotificationRetentionTestCase(APITestCase):
+    def setUp(self):
+        """
+        Create notifications of various ages, verbs and read states.
+        """
+        self.user = User.objects.create_user(username='user', password='password123')
+        self.post = Post.objects.create(author=self.user, title='Hello', content='World')
+        now = timezone.now()
+        self.rows = {}
+        for name, verb, age, read in [
+            ('old_like', 'liked your post', 40, True),
+            ('old_unread_like', 'liked your post', 40, False),
+            ('recent_like', 'liked your post', 10, True),
+            ('old_comment', 'commented', 100, True),
+            ('recent_comment', 'commented', 40, True),
+            ('old_mention', 'mentioned you', 400, True),
+        ]:
+            notification = Notification.objects.create(
+                recipient=self.user, actor=self.user, verb=verb, target=self.post, read=read
+            )
+            Notification.objects.filter(pk=notification.pk).update(timestamp=now - timedelta(days=age))
+            NotificationActor.objects.create(
+                notification=notification, actor=self.user, acted_at=now - timedelta(days=age)
+            )
+            self.rows[name] = notification.pk
+
+    def remaining(self):
+        return {name for name, pk in self.rows.items() if Notification.objects.filter(pk=pk).exists()}
+
+    def test_prune_deletes_expired_read_notifications_per_verb(self):
+        out = StringIO()
+        call_command('prune_notifications', batch_size=2, pause=0, stdout=out)
+        self.assertEqual(self.remaining(), {'old_unread_like', 'recent_like', 'recent_comment', 'old_mention'})
+        self.assertFalse(NotificationArchive.objects.exists())
+        self.assertEqual(NotificationActor.objects.count(), 4)
+        # Cascaded actor rows are not counted as pruned notifications
+        self.assertIn('Deleted 2 expired notification(s).', out.getvalue())
+
+    def test_prune_archive_moves_rows(self):
+        call_command('prune_notifications', archive=True, pause=0, stdout=StringIO())
+        self.assertEqual(
+            sorted(NotificationArchive.objects.values_list('verb', flat=True)),
+            ['commented', 'liked your post'],
+        )
+        self.assertEqual(len(self.remaining()), 4)
+
+
+@override_settings(NOTIFICATION_STREAM_HEARTBEAT=5, NOTIFICATION_STREAM_POLL_INTERVAL=0.05)
+class NotificationStreamTestCase(TestCase):
+    def setUp(self):
+        self.recipient = User.objects.create_user(username='recipient', password='password123')
+        self.actor = User.objects.create_user(username='actor', password='password123')
+        self.token = Token.objects.create(user=self.recipient)
+        self.post = Post.objects.create(author=self.recipient, title='Hello', content='World')
+        self.first = self.notify()
+
+    def notify(self):
+        return Notification.objects.create(
+            recipient=self.recipient, actor=self.actor, verb='liked your post', target=self.post
+        )
+
+    async def open_stream(self, **headers):
+        headers.setdefault('authorization', f'Token {self.token.key}')
+        response = await self.async_client.get(reverse('notifications_stream'), headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        self.assertTrue((await self.next_chunk(events)).startswith('retry:'))
+        return events
+
+    async def next_chunk(self, events):
+        chunk = await asyncio.wait_for(anext(events), timeout=2)
+        return chunk.decode() if isinstance(chunk, bytes) else chunk
+
+    async def test_resume_replays_missed_then_pushes_new_notifications(self):
+        """
+        Last-Event-ID replays what the client missed; published notifications
+        are then pushed as they arrive.
+        """
+        events = await self.open_stream(last_event_id='0')
+        self.assertIn(f'id: {self.first.pk}\n', await self.next_chunk(events))
+
+        second = await sync_to_async(self.notify)()
+        broker.publish(self.recipient.pk, second.pk)
+        chunk = await self.next_chunk(events)
+        self.assertIn(f'id: {second.pk}\n', chunk)
+        self.assertIn('"summary":"actor liked your post"', chunk.replace(': ', ':'))
+        await events.aclose()
+
+    @override_settings(NOTIFICATION_STREAM_HEARTBEAT=0.05)
+    async def test_heartbeats_do_not_query_until_the_log_is_lost(self):
+        """
+        A fresh stream starts after the newest row and sends heartbeats
+        without reading the database. Once the cache loses the log, the
+        stream reloads from the database and finds what it missed.
+        """
+        loads = []
+        load = views._load
+
+        def counting_load(*args):
+            loads.append(args)
+            return load(*args)
+
+        with mock.patch.object(views, '_load', counting_load):
+            events = await self.open_stream()
+            for _ in range(3):
+                self.assertEqual(await self.next_chunk(events), ': heartbeat\n\n')
+            self.assertEqual(len(loads), 1)
+
+            second = await sync_to_async(self.notify)()
+            await sync_to_async(cache.delete)(broker._position_key(self.recipient.pk))
+            chunk = await self.next_chunk(events)
+            while chunk.startswith(':'):
+                chunk = await self.next_chunk(events)
+            self.assertIn(f'id: {second.pk}\n', chunk)
+            await events.aclose()
+
+    def test_refused_under_wsgi(self):
+        """Under WSGI a stream would pin a worker, so the view answers 501."""
+        response = self.client.get(reverse('notifications_stream'), HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+    async def test_notifications_published_by_another_process_arrive(self):
+        """
+        A publish from the worker process reaches the stream through the
+        shared cache log within a poll interval, coalesced updates included.
+        """
+        events = await self.open_stream()
+        with mock.patch.object(broker, '_subscribers', defaultdict(list)):
+            # Another process: nothing subscribed there
+            await sync_to_async(Notification.objects.filter(pk=self.first.pk).update)(actor_count=2)
+            broker.publish(self.recipient.pk, self.first.pk)
+        chunk = await self.next_chunk(events)
+        self.assertIn(f'id: {self.first.pk}\n', chunk)
+        self.assertIn('and 1 other', chunk)
+        await events.aclose()
+
+    async def test_stream_ticket_is_single_use(self):
+        response = await sync_to_async(self.client.post)(
+            reverse('notifications_stream_ticket'), HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        ticket = response.json()['ticket']
+
+        response = await self.async_client.get(reverse('notifications_stream'), {'ticket': ticket})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        await aiter(response.streaming_content).aclose()
+        response = await self.async_client.get(reverse('notifications_stream'), {'ticket': ticket})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(NOTIFICATION_STREAM_MAX_CONNECTIONS=1)
+    async def test_new_connection_closes_the_oldest(self):
+        first = await self.open_stream()
+        second = await self.open_stream()
+        with self.assertRaises(StopAsyncIteration):
+            await self.next_chunk(first)
+        await second.aclose()
+
+    async def test_requires_authentication(self):
+        # The API token is not accepted in the URL
+        response = await self.async_client.get(reverse('notifications_stream'), {'token': self.token.key})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = await self.async_client.get(reverse('notifications_stream'), {'ticket': 'bogus'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = await self.async_client.get(reverse('notifications_stream'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
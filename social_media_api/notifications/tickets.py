@@ -0,0 +1,34 @@
+"""
+Short-lived, single-use tickets for opening the notification stream.
+
+EventSource can't send an Authorization header, and putting the API token
+in the stream URL would leak it into access logs and browser history. A
+client instead POSTs to the ticket endpoint with its token, then opens
+`/api/notifications/stream/?ticket=...` within NOTIFICATION_STREAM_TICKET_TTL
+seconds. Redeeming a ticket deletes it, so a logged URL is useless.
+"""
+import secrets
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _key(ticket):
+    return f'notifications:stream-ticket:{ticket}'
+
+
+def issue(user_id):
+    """Return a new ticket that redeems to `user_id`."""
+    ticket = secrets.token_urlsafe(32)
+    cache.set(_key(ticket), user_id, settings.NOTIFICATION_STREAM_TICKET_TTL)
+    return ticket
+
+
+def redeem(ticket):
+    """The user ID `ticket` was issued to, or None. A ticket redeems once."""
+    key = _key(ticket)
+    user_id = cache.get(key)
+    # Only the caller whose delete removed the key gets the user
+    if user_id is None or not cache.delete(key):
+        return None
+    return user_id
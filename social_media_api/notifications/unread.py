@@ -0,0 +1,36 @@
+"""
+Per-user cached count of unread notifications.
+
+The count is computed once from the (recipient, read, timestamp) index and
+then kept in the cache: it is incremented when a notification is created and
+dropped whenever notifications are marked as read, so the next read
+recomputes it. Clients can poll the badge without loading any notifications.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Notification
+
+
+def _key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def get(user_id):
+    count = cache.get(_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, read=False).count()
+        cache.set(_key(user_id), count, settings.NOTIFICATION_UNREAD_COUNT_TTL)
+    return count
+
+
+def increment(user_id, delta=1):
+    try:
+        cache.incr(_key(user_id), delta)
+    except ValueError:
+        # Not cached; the next get() recomputes it
+        pass
+
+
+def clear(user_id):
+    cache.delete(_key(user_id))
@@ -1,6 +1,13 @@
 from django.urls import path
-from .views import NotificationListView
+from .views import (
+    NotificationListView, UnreadCountView, MarkReadView, MarkAllReadView, StreamTicketView, notification_stream,
+)
 
 urlpatterns = [
     path('', NotificationListView.as_view(), name='notifications_list'),
-]
\ No newline at end of file
+    path('unread_count/', UnreadCountView.as_view(), name='notifications_unread_count'),
+    path('mark-read/', MarkReadView.as_view(), name='notifications_mark_read'),
+    path('mark-all-read/', MarkAllReadView.as_view(), name='notifications_mark_all_read'),
+    path('stream/', notification_stream, name='notifications_stream'),
+    path('stream/ticket/', StreamTicketView.as_view(), name='notifications_stream_ticket'),
+]
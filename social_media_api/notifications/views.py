@@ -1,11 +1,219 @@
-from rest_framework import generics, permissions
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Max, Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import generics, permissions, status
+from rest_framework.authentication import get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.views import APIView
+from accounts.authentication import CachedTokenAuthentication
+from social_media_api.pagination import KeysetPagination
+from . import broker, tickets, unread
 from .models import Notification
-from .serializers import NotificationSerializer
+from .serializers import MarkReadSerializer, NotificationSerializer
+
+class NotificationPagination(KeysetPagination):
+    ordering = ('-timestamp', '-id')
 
 class NotificationListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = NotificationSerializer
+    pagination_class = NotificationPagination
 
     def get_queryset(self):
         # Show newest notifications first
-        return Notification.objects.filter(recipient=self.request.user).order_by('-timestamp')
\ No newline at end of file
+        return Notification.objects.filter(recipient=self.request.user).with_related().order_by('-timestamp', '-id')
+
+class UnreadCountView(APIView):
+    """
+    GET /api/notifications/unread_count/
+    - Number of unread notifications, served from a per-user cached counter.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response({'unread_count': unread.get(request.user.pk)})
+
+class MarkReadView(APIView):
+    """
+    POST /api/notifications/mark-read/ {"ids": [...]}
+    - Mark the given notifications of the current user as read in one UPDATE.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = MarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = Notification.objects.filter(
+            recipient=request.user, pk__in=serializer.validated_data['ids'], read=False
+        ).update(read=True)
+        unread.clear(request.user.pk)
+        return Response({'updated': updated}, status=status.HTTP_200_OK)
+
+class MarkAllReadView(APIView):
+    """
+    POST /api/notifications/mark-all-read/
+    - Mark every unread notification of the current user as read in one UPDATE.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        updated = Notification.objects.filter(recipient=request.user, read=False).update(read=True)
+        unread.clear(request.user.pk)
+        return Response({'updated': updated}, status=status.HTTP_200_OK)
+
+
+class StreamTicketView(APIView):
+    """
+    POST /api/notifications/stream/ticket/
+    - A single-use ticket for opening the notification stream from an
+      EventSource, which can't send the Authorization header. Pass it as
+      ?ticket= within `expires_in` seconds.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        return Response({
+            'ticket': tickets.issue(request.user.pk),
+            'expires_in': settings.NOTIFICATION_STREAM_TICKET_TTL,
+        }, status=status.HTTP_201_CREATED)
+
+
+# Server-sent events stream of new notifications, for ASGI deployments. See
+# notifications.broker for how new rows reach an open stream.
+
+STREAM_BATCH_SIZE = 100
+
+async def _stream_user(request):
+    """
+    The user behind the Authorization token, a ?ticket= from
+    StreamTicketView, or the session, else None.
+    """
+    auth = get_authorization_header(request).split()
+    if len(auth) == 2 and auth[0].lower() == b'token':
+        try:
+            user, _ = await sync_to_async(CachedTokenAuthentication().authenticate_credentials)(
+                auth[1].decode(errors='replace')
+            )
+        except AuthenticationFailed:
+            return None
+        return user
+    if 'ticket' in request.GET:
+        user_id = await sync_to_async(tickets.redeem)(request.GET['ticket'])
+        if user_id is None:
+            return None
+        return await get_user_model()._default_manager.filter(pk=user_id, is_active=True).afirst()
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+def _last_event_id(request):
+    value = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _newest_id(user_id):
+    return Notification.objects.filter(recipient_id=user_id).aggregate(newest=Max('id'))['newest'] or 0
+
+def _load(user_id, after_id, updated_ids):
+    """Notifications newer than `after_id`, plus re-sent updated ones, oldest first."""
+    notifications = (
+        Notification.objects.filter(recipient_id=user_id)
+        .filter(Q(pk__gt=after_id) | Q(pk__in=updated_ids))
+        .with_related()
+        .order_by('pk')[:STREAM_BATCH_SIZE]
+    )
+    return NotificationSerializer(notifications, many=True).data
+
+def _event(notification):
+    data = json.dumps(notification, cls=JSONEncoder)
+    return f"id: {notification['id']}\nevent: notification\ndata: {data}\n\n"
+
+async def _events(user_id, queue, last_id, position):
+    heartbeat = settings.NOTIFICATION_STREAM_HEARTBEAT
+    poll_interval = min(settings.NOTIFICATION_STREAM_POLL_INTERVAL, heartbeat)
+    yield f"retry: {int(heartbeat * 1000)}\n\n"
+    try:
+        updated = set()
+        while True:
+            # Catch up from the database
+            notifications = await sync_to_async(_load)(user_id, last_id, updated)
+            for notification in notifications:
+                last_id = max(last_id, notification['id'])
+                yield _event(notification)
+            updated.clear()
+            if len(notifications) == STREAM_BATCH_SIZE:
+                continue
+
+            # Wait for published IDs, with a heartbeat while idle. The
+            # database is only read again once the log has news or lost track
+            deadline = asyncio.get_running_loop().time() + heartbeat
+            while True:
+                timeout = min(poll_interval, deadline - asyncio.get_running_loop().time())
+                try:
+                    item = await asyncio.wait_for(queue.get(), max(timeout, 0))
+                except asyncio.TimeoutError:
+                    item = None
+                while item is not None:
+                    if item is broker.CLOSE:
+                        return
+                    item = None if queue.empty() else queue.get_nowait()
+
+                position, ids = await sync_to_async(broker.updates)(user_id, position)
+                if ids is None or ids:
+                    updated.update(ids or ())
+                    break
+                if asyncio.get_running_loop().time() >= deadline:
+                    yield ": heartbeat\n\n"
+                    deadline = asyncio.get_running_loop().time() + heartbeat
+    finally:
+        broker.unsubscribe(user_id, queue)
+
+@require_GET
+async def notification_stream(request):
+    """
+    GET /api/notifications/stream/
+    - text/event-stream of the current user's notifications as they arrive,
+      one `notification` event per row with its ID as the event ID. A
+      reconnecting client sends Last-Event-ID and receives what it missed.
+      Authenticate with the Authorization header, the session, or a
+      ?ticket= from /api/notifications/stream/ticket/.
+    - ASGI only: under WSGI (including runserver) each open stream would hold
+      a worker thread for as long as the client stays connected, so the
+      request is refused with 501.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'detail': 'The notification stream is only served under ASGI.'},
+            status=status.HTTP_501_NOT_IMPLEMENTED,
+        )
+
+    user = await _stream_user(request)
+    if user is None:
+        return JsonResponse(
+            {'detail': 'Authentication credentials were not provided.'},
+            status=status.HTTP_401_UNAUTHORIZED,
+        )
+
+    # Subscribe before reading the resume point so nothing falls in between
+    queue = broker.subscribe(user.pk)
+    position = await sync_to_async(broker.position)(user.pk)
+    last_id = _last_event_id(request)
+    if last_id is None:
+        last_id = await sync_to_async(_newest_id)(user.pk)
+
+    response = StreamingHttpResponse(
+        _events(user.pk, queue, last_id, position), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,77 @@
+"""
+Strong ETags for post detail and feed responses.
+
+Validators are computed from a narrow `values()` query over the rows a
+response would show, never from the rendered body. A matching
+If-None-Match is therefore answered with 304 before any post is loaded,
+prefetched or serialized.
+
+A validator covers every column the response renders from the post row.
+That includes the like/comment counters, which change without touching
+`updated_at`, so Last-Modified alone could not be strong. Edits to comments
+already shown in a post's preview are covered for detail responses only.
+"""
+import hashlib
+import json
+
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .models import Post
+
+# Post columns whose changes alter a serialized post
+POST_VERSION_FIELDS = ('id', 'created_at', 'updated_at', 'like_count', 'comment_count')
+
+
+def _etag(request, *parts):
+    # The same rows render differently per format (JSON vs browsable API)
+    renderer = getattr(request, 'accepted_renderer', None)
+    payload = json.dumps([getattr(renderer, 'format', None), *parts], default=str)
+    return quote_etag(hashlib.sha256(payload.encode('utf-8')).hexdigest())
+
+
+def post_etag(request, pk):
+    """ETag of a post detail response, or None if the post does not exist."""
+    try:
+        version = (
+            Post.objects.visible().filter(pk=pk)
+            .values(*POST_VERSION_FIELDS, 'author__username')
+            .annotate(comments_updated_at=Max('comments__updated_at'))
+            .first()
+        )
+    except (TypeError, ValueError):
+        return None
+    if version is None:
+        return None
+    return _etag(request, sorted(version.items()))
+
+
+def page_etag(request, paginator, queryset, view):
+    """
+    ETag of one page of posts: the ID set and versions of the rows on it
+    (newest created_at included), plus the URL that selects the page.
+    """
+    rows = paginator.get_page_queryset(queryset.prefetch_related(None), request, view)
+    return _etag(
+        request,
+        getattr(request.user, 'pk', None),
+        request.get_full_path(),
+        list(rows.values_list(*POST_VERSION_FIELDS)),
+    )
+
+
+def not_modified(request, etag):
+    """A 304 response if the client's If-None-Match matches `etag`, else None."""
+    if etag is None:
+        return None
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response['ETag'] = etag
+    return response
+
+
+def tag(response, etag):
+    if etag is not None and response.status_code == 200:
+        response['ETag'] = etag
+    return response
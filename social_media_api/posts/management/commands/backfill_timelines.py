@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized home timeline of existing users from the accounts they follow."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help="Only rebuild these users' timelines (default: every user).",
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        rebuilt = 0
+        for user_id in users.values_list('pk', flat=True).iterator():
+            timeline.rebuild(user_id)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} timeline(s)."))
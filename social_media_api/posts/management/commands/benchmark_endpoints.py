@@ -0,0 +1,256 @@
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max
+from django.test import Client
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from notifications.models import NotificationEvent
+from posts.models import Like, Post, PostScore
+
+SCENARIOS = ('feed', 'posts', 'posts_anonymous', 'post_detail', 'notifications', 'like_unlike')
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure latency percentiles and throughput of the feed, post list and detail, "
+        "notification list and like/unlike endpoints, in-process or against a running "
+        "server, and print them as JSON. Run seed_social_graph first. Tokens the run "
+        "creates, and the trending scores and notification events its likes produce, "
+        "are removed again at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help="Timed requests per endpoint (default: 200).",
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=20,
+            help="Untimed requests sent to each endpoint first (default: 20).",
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help="Requests in flight at once (default: 1).",
+        )
+        parser.add_argument(
+            '--users', type=int, default=50,
+            help="Number of users the requests are spread across (default: 50).",
+        )
+        parser.add_argument(
+            '--prefix', default='seed',
+            help="Only act as users whose username starts with PREFIX_ (default: seed). "
+                 "Pass an empty string to use any active user.",
+        )
+        parser.add_argument(
+            '--scenario', action='append', choices=SCENARIOS,
+            help="Endpoint to measure; repeat for several (default: all).",
+        )
+        parser.add_argument(
+            '--url',
+            help="Base URL of a running server, e.g. http://127.0.0.1:8000 "
+                 "(default: call the views in-process with the test client).",
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help="Random seed for picking users and posts (default: 0).",
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        users = get_user_model().objects.filter(is_active=True)
+        if options['prefix']:
+            users = users.filter(username__startswith=f"{options['prefix']}_")
+        user_ids = list(users.order_by('pk').values_list('pk', flat=True))
+        post_ids = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+        if not user_ids or not post_ids:
+            raise CommandError("No users or posts to benchmark with; run seed_social_graph first.")
+
+        user_ids = self.rng.sample(user_ids, min(options['users'], len(user_ids)))
+        tokens, minted = [], []
+        for user_id in user_ids:
+            token, created = Token.objects.get_or_create(user_id=user_id)
+            tokens.append(token.key)
+            if created:
+                minted.append(token.pk)
+        count = options['warmup'] + options['requests']
+
+        # Functions undoing what the scenarios changed, run once they are done
+        self.cleanups = []
+        results = {}
+        try:
+            for scenario in options['scenario'] or SCENARIOS:
+                for name, requests in self.build(scenario, count, tokens, user_ids, post_ids):
+                    timings = self.run(requests, options['url'], options['concurrency'])
+                    results[name] = self.summarize(timings[options['warmup']:])
+        finally:
+            for cleanup in reversed(self.cleanups):
+                cleanup()
+            Token.objects.filter(pk__in=minted).delete()
+
+        self.stdout.write(json.dumps({
+            'target': options['url'] or 'in-process',
+            'debug': settings.DEBUG,
+            'concurrency': options['concurrency'],
+            'users': len(user_ids),
+            'posts': len(post_ids),
+            'endpoints': results,
+        }, indent=2))
+
+    def build(self, scenario, count, tokens, user_ids, post_ids):
+        """Yield (name, [(method, path, token), ...]) for `scenario`."""
+        def token():
+            return self.rng.choice(tokens)
+
+        if scenario == 'feed':
+            yield 'feed', [('GET', reverse('user_feed'), token()) for _ in range(count)]
+        elif scenario == 'posts':
+            yield 'posts', [('GET', reverse('post-list'), token()) for _ in range(count)]
+        elif scenario == 'posts_anonymous':
+            yield 'posts_anonymous', [('GET', reverse('post-list'), None) for _ in range(count)]
+        elif scenario == 'post_detail':
+            yield 'post_detail', [
+                ('GET', reverse('post-detail', args=[self.rng.choice(post_ids)]), token())
+                for _ in range(count)
+            ]
+        elif scenario == 'notifications':
+            yield 'notifications', [('GET', reverse('notifications_list'), token()) for _ in range(count)]
+        elif scenario == 'like_unlike':
+            # Like posts the users have not liked yet, then unlike the same
+            # ones, so the run leaves the likes as it found them. The other
+            # writes a like makes are undone by the cleanup.
+            pairs = self.unliked_pairs(count, tokens, user_ids, post_ids)
+            self.cleanups.append(self.like_cleanup(user_ids, {post_id for _, post_id in pairs}))
+            yield 'like', [('POST', reverse('like_post', args=[post_id]), key) for key, post_id in pairs]
+            yield 'unlike', [('POST', reverse('unlike_post', args=[post_id]), key) for key, post_id in pairs]
+
+    def unliked_pairs(self, count, tokens, user_ids, post_ids):
+        liked = set(
+            Like.objects.filter(user_id__in=user_ids).values_list('user_id', 'post_id')
+        )
+        pairs = {}
+        for _ in range(count * 20):
+            if len(pairs) == count:
+                break
+            index = self.rng.randrange(len(user_ids))
+            post_id = self.rng.choice(post_ids)
+            if (user_ids[index], post_id) not in liked:
+                pairs[(user_ids[index], post_id)] = tokens[index]
+        return [(key, post_id) for (_, post_id), key in pairs.items()]
+
+    def like_cleanup(self, user_ids, post_ids):
+        """
+        Snapshot the trending scores of `post_ids` and return a function that
+        restores them and drops the like/unlike notification events the run
+        queued for them.
+
+        An event is only dropped while its like is still queued too: once a
+        process_notifications worker has delivered the like, its unlike must
+        stay queued to retract it again. Like counts and unread badges net
+        out on their own.
+        """
+        scores = list(PostScore.objects.filter(post_id__in=post_ids))
+        last_event = NotificationEvent.objects.aggregate(last=Max('pk'))['last'] or 0
+
+        def cleanup():
+            events = NotificationEvent.objects.filter(
+                pk__gt=last_event,
+                actor_id__in=user_ids,
+                content_type=ContentType.objects.get_for_model(Post),
+                object_id__in=post_ids,
+            )
+            queued = list(events.values('pk', 'actor_id', 'object_id', 'undo'))
+            pending_likes = {(row['actor_id'], row['object_id']) for row in queued if not row['undo']}
+            events.filter(pk__in=[
+                row['pk'] for row in queued if (row['actor_id'], row['object_id']) in pending_likes
+            ]).delete()
+
+            PostScore.objects.filter(post_id__in=post_ids).exclude(pk__in=[score.pk for score in scores]).delete()
+            PostScore.objects.bulk_update(scores, ['score', 'scored_at'])
+        return cleanup
+
+    def run(self, requests, url, concurrency):
+        """Send `requests` and return (status, seconds, started) for each, in order."""
+        send = self.send_remote if url else self.send_local
+
+        def send_all(chunk):
+            client = None if url else Client(HTTP_HOST=self.host(), raise_request_exception=False)
+            timings = []
+            for method, path, token in chunk:
+                started = time.perf_counter()
+                status = send(client or url, method, path, token)
+                timings.append((status, time.perf_counter() - started, started))
+            return timings
+
+        def worker(chunk):
+            try:
+                return send_all(chunk)
+            finally:
+                connections.close_all()
+
+        if concurrency == 1:
+            return send_all(requests)
+        chunks = [requests[i::concurrency] for i in range(concurrency)]
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            timings = [timing for chunk in pool.map(worker, chunks) for timing in chunk]
+        return sorted(timings, key=lambda timing: timing[2])
+
+    def host(self):
+        # DEBUG with an empty ALLOWED_HOSTS only accepts localhost names
+        return 'localhost' if settings.DEBUG and not settings.ALLOWED_HOSTS else 'testserver'
+
+    def send_local(self, client, method, path, token):
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        response = client.generic(method, path, **headers)
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    def send_remote(self, base_url, method, path, token):
+        request = urllib.request.Request(base_url.rstrip('/') + path, method=method)
+        if token:
+            request.add_header('Authorization', f'Token {token}')
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+    def summarize(self, timings):
+        if not timings:
+            return {'requests': 0}
+        latencies = sorted(seconds for _, seconds, _ in timings)
+        elapsed = max(started + seconds for _, seconds, started in timings) - min(
+            started for _, _, started in timings
+        )
+        return {
+            'requests': len(timings),
+            'seconds': round(elapsed, 3),
+            'requests_per_second': round(len(timings) / elapsed, 2),
+            'status_codes': dict(Counter(status for status, _, _ in timings)),
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies) * 1000, 2),
+                'p50': round(percentile(latencies, 0.50) * 1000, 2),
+                'p95': round(percentile(latencies, 0.95) * 1000, 2),
+                'p99': round(percentile(latencies, 0.99) * 1000, 2),
+                'max': round(latencies[-1] * 1000, 2),
+            },
+        }
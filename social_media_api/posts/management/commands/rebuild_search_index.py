@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts import response_cache, search
+
+
+class Command(BaseCommand):
+    help = (
+        "Drop and recreate the FTS5 post search index and its sync triggers, "
+        "then repopulate it from every post."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default='default',
+            help="Database alias to rebuild the index on (default: 'default').",
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_available(options['database']):
+            raise CommandError("Full-text search indexing requires SQLite with FTS5.")
+
+        search.install(connections[options['database']])
+        # Cached search results may differ from the rebuilt index
+        response_cache.bump()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
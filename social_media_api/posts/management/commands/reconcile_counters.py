@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from accounts.models import Follow
+from posts.models import Comment, Like, Post
+
+
+def count_of(model, field):
+    """Correlated subquery counting `model` rows whose `field` points at the outer row."""
+    rows = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(n=Count('pk'))
+        .values('n')
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the denormalized like/comment counters on posts and the "
+        "follower/following counters on users, repairing any drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of primary keys to reconcile per UPDATE (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        User = get_user_model()
+
+        targets = [
+            (Post, 'like_count', count_of(Like, 'post')),
+            (Post, 'comment_count', count_of(Comment, 'post')),
+            (User, 'follower_count', count_of(Follow, 'from_customuser')),
+            (User, 'following_count', count_of(Follow, 'to_customuser')),
+        ]
+        for model, field, actual in targets:
+            repaired = self.reconcile(model, field, actual, batch_size)
+            self.stdout.write(f"{model._meta.label}.{field}: repaired {repaired} row(s)")
+
+        self.stdout.write(self.style.SUCCESS("Counters reconciled."))
+
+    def reconcile(self, model, field, actual, batch_size):
+        """
+        Walk the table in primary-key ranges so each UPDATE touches at most
+        `batch_size` rows and only rewrites rows whose stored count is wrong.
+        """
+        bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            return 0
+
+        repaired = 0
+        start = bounds['low']
+        while start <= bounds['high']:
+            chunk = model.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+            repaired += chunk.exclude(**{field: actual}).update(**{field: actual})
+            start += batch_size
+        return repaired
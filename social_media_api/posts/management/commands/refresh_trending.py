@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = "Recompute the cached list of trending posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep running and refresh the list every --interval seconds.",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=30.0,
+            help="Seconds between refreshes with --loop (default: 30).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            top_posts = trending.refresh()
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Cached {len(top_posts)} trending post(s)."))
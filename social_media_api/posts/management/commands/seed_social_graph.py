@@ -0,0 +1,286 @@
+import itertools
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from accounts.models import Follow
+from notifications.models import Notification, NotificationActor
+from posts import response_cache, timeline
+from posts.models import Comment, Like, Post
+
+WORDS = (
+    'coffee morning travel django python code music weekend garden recipe pasta city '
+    'running book review photo sunset launch release bug fix team coffee mountain river '
+    'concert game football movie design database cache queue deploy holiday friends'
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic users, a power-law follow graph, posts, "
+        "comments, likes and notifications, for load testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help="Users to create (default: 1000).",
+        )
+        parser.add_argument(
+            '--following', type=float, default=20,
+            help="Average number of accounts each user follows (default: 20).",
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.0,
+            help="Zipf exponent of account popularity; higher concentrates followers "
+                 "on fewer accounts (default: 1.0).",
+        )
+        parser.add_argument(
+            '--posts', type=float, default=5,
+            help="Average posts per user (default: 5).",
+        )
+        parser.add_argument(
+            '--comments', type=float, default=2,
+            help="Average comments per post (default: 2).",
+        )
+        parser.add_argument(
+            '--likes', type=float, default=5,
+            help="Average likes per post (default: 5).",
+        )
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help="Spread post timestamps over this many past days (default: 30).",
+        )
+        parser.add_argument(
+            '--prefix', default='seed',
+            help="Username prefix of the generated users (default: seed).",
+        )
+        parser.add_argument(
+            '--password', default='seed-password',
+            help="Password of every generated user (default: seed-password).",
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help="Random seed, so runs are reproducible (default: 0).",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Rows per INSERT (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if User.objects.filter(username__startswith=f"{options['prefix']}_").exists():
+            raise CommandError(
+                f"Users named {options['prefix']}_* already exist; pass another --prefix."
+            )
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.window = timedelta(days=options['days']).total_seconds()
+
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'], options['prefix'], options['password'])
+            follows = self.create_follows(user_ids, options['following'], options['exponent'])
+            posts = self.create_posts(user_ids, options['posts'])
+            comments = self.create_comments(user_ids, posts, options['comments'])
+            likes = self.create_likes(user_ids, posts, options['likes'])
+            notifications = self.create_notifications(likes)
+
+            # Follower counts decide which authors are fanned out, so fix them first
+            call_command('reconcile_counters', batch_size=self.batch_size, stdout=self.stdout)
+            by_author = defaultdict(list)
+            for post in posts:
+                by_author[post.author_id].append(post)
+            for author_posts in by_author.values():
+                timeline.fan_out_posts(author_posts)
+
+        # bulk_create sends no signals, so expire cached responses by hand
+        response_cache.bump_all()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(user_ids)} user(s), {follows} follow(s), {len(posts)} post(s), "
+            f"{len(comments)} comment(s), {len(likes)} like(s) and "
+            f"{notifications} notification(s)."
+        ))
+
+    def insert(self, model, objects, timestamps=()):
+        """
+        bulk_create `objects`, then set their `timestamps` fields back to
+        the values they were given, which auto_now/auto_now_add overwrote.
+        """
+        given = [[getattr(obj, field) for field in timestamps] for obj in objects]
+        objects = model.objects.bulk_create(objects, batch_size=self.batch_size)
+        if not timestamps:
+            return objects
+
+        rows = list(zip(objects, given))
+        for start in range(0, len(rows), self.batch_size):
+            self.backdate(model, timestamps, rows[start:start + self.batch_size])
+        for obj, values in rows:
+            for field, value in zip(timestamps, values):
+                setattr(obj, field, value)
+        return objects
+
+    def backdate(self, model, fields, rows):
+        """
+        Set `fields` of each (object, values) in `rows` with one UPDATE. The
+        CASE is written as SQL because compiling a When() per row costs more
+        than the seeding itself.
+        """
+        connection = connections[model.objects.db]
+        pk = connection.ops.quote_name(model._meta.pk.column)
+        sql = f"CASE {pk} {' '.join(['WHEN %s THEN %s'] * len(rows))} END"
+        updates = {}
+        for index, name in enumerate(fields):
+            field = model._meta.get_field(name)
+            params = [
+                param for obj, values in rows
+                for param in (obj.pk, field.get_db_prep_value(values[index], connection))
+            ]
+            updates[name] = RawSQL(sql, params, output_field=field)
+        model.objects.filter(pk__in=[obj.pk for obj, _ in rows]).update(**updates)
+
+    def timestamp(self, after=None):
+        """A random moment within --days, later than `after` if given."""
+        earliest = self.now.timestamp() - self.window
+        if after is not None:
+            earliest = max(earliest, after.timestamp())
+        moment = self.rng.uniform(earliest, self.now.timestamp())
+        return self.now - timedelta(seconds=self.now.timestamp() - moment)
+
+    def count(self, mean):
+        """A non-negative count with the given mean and a long tail."""
+        return int(self.rng.expovariate(1 / mean)) if mean > 0 else 0
+
+    def sentence(self, words):
+        return ' '.join(self.rng.choices(WORDS, k=words))
+
+    def create_users(self, count, prefix, password):
+        User = get_user_model()
+        # Hashing is deliberately slow, so every user shares one hash
+        hashed = make_password(password)
+        users = [
+            User(username=f'{prefix}_{i}', email=f'{prefix}_{i}@example.com', password=hashed)
+            for i in range(count)
+        ]
+        return [user.pk for user in self.insert(User, users)]
+
+    def create_follows(self, user_ids, following, exponent):
+        """
+        Build a scale-free follow graph: accounts are ranked by a shuffled
+        Zipf popularity and followees are drawn in proportion to it, while
+        the number of accounts each user follows is Pareto distributed.
+        """
+        if len(user_ids) < 2:
+            return 0
+        ranked = list(user_ids)
+        self.rng.shuffle(ranked)
+        popularity = list(itertools.accumulate((rank + 1) ** -exponent for rank in range(len(ranked))))
+
+        edges = []
+        for follower_id in user_ids:
+            # Pareto(2) has mean 2, so halve it to average `following`
+            wanted = min(len(user_ids) - 1, int(following / 2 * self.rng.paretovariate(2)))
+            followees = set(self.rng.choices(ranked, cum_weights=popularity, k=wanted))
+            followees.discard(follower_id)
+            edges.extend(
+                Follow(from_customuser_id=followee_id, to_customuser_id=follower_id)
+                for followee_id in followees
+            )
+        Follow.objects.bulk_create(edges, batch_size=self.batch_size, ignore_conflicts=True)
+        return len(edges)
+
+    def create_posts(self, user_ids, per_user):
+        posts = [
+            Post(
+                author_id=author_id,
+                title=self.sentence(self.rng.randint(2, 6)).capitalize(),
+                content=self.sentence(self.rng.randint(10, 60)),
+                created_at=created_at,
+                updated_at=created_at,
+            )
+            for author_id in user_ids
+            for created_at in (self.timestamp() for _ in range(self.count(per_user)))
+        ]
+        return self.insert(Post, posts, ['created_at', 'updated_at'])
+
+    def create_comments(self, user_ids, posts, per_post):
+        comments = [
+            Comment(
+                post=post,
+                author_id=self.rng.choice(user_ids),
+                content=self.sentence(self.rng.randint(3, 25)),
+                created_at=created_at,
+                updated_at=created_at,
+            )
+            for post in posts
+            for created_at in (self.timestamp(after=post.created_at) for _ in range(self.count(per_post)))
+        ]
+        return self.insert(Comment, comments, ['created_at', 'updated_at'])
+
+    def create_likes(self, user_ids, posts, per_post):
+        likes = [
+            Like(post=post, user_id=user_id, created_at=self.timestamp(after=post.created_at))
+            for post in posts
+            for user_id in self.rng.sample(user_ids, min(len(user_ids), self.count(per_post)))
+        ]
+        return self.insert(Like, likes, ['created_at'])
+
+    def create_notifications(self, likes):
+        """
+        Notify post authors of their likes in the shape `outbox.drain()`
+        leaves them: likes on a post that follow each other within
+        NOTIFICATION_COALESCE_WINDOW share one notification, with a
+        NotificationActor row per liker. Half of the notifications are read.
+        """
+        post_type = ContentType.objects.get_for_model(Post)
+        window = timedelta(seconds=settings.NOTIFICATION_COALESCE_WINDOW)
+        by_post = defaultdict(list)
+        for like in likes:
+            if like.user_id != like.post.author_id:
+                by_post[like.post].append(like)
+
+        groups = []
+        for post, post_likes in by_post.items():
+            post_likes.sort(key=lambda like: like.created_at)
+            group = [post_likes[0]]
+            for like in post_likes[1:]:
+                # drain() merges into a notification whose latest actor is recent enough
+                if like.created_at - group[-1].created_at > window:
+                    groups.append((post, group))
+                    group = []
+                group.append(like)
+            groups.append((post, group))
+
+        notifications = self.insert(Notification, [
+            Notification(
+                recipient_id=post.author_id,
+                actor_id=group[-1].user_id,
+                # The only verb the app emits (posts.views)
+                verb='liked your post',
+                content_type=post_type,
+                object_id=post.pk,
+                actor_count=len(group),
+                timestamp=group[-1].created_at,
+                read=self.rng.random() < 0.5,
+            )
+            for post, group in groups
+        ], ['timestamp'])
+        self.insert(NotificationActor, [
+            NotificationActor(notification=notification, actor_id=like.user_id, acted_at=like.created_at)
+            for notification, (_, group) in zip(notifications, groups)
+            for like in group
+        ])
+        return len(notifications)
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-created_at', '-post'], name='timeline_owner_created_idx'), models.Index(fields=['owner', 'author'], name='timeline_owner_author_idx')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'post'), name='unique_timeline_entry')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:48
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+
+    def count_of(model_name):
+        rows = apps.get_model('posts', model_name).objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(n=Count('pk')).values('n')
+        return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+    Post.objects.update(like_count=count_of('Like'), comment_count=count_of('Comment'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
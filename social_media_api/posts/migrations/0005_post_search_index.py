@@ -0,0 +1,65 @@
+from django.db import migrations
+
+# Frozen copy of posts.search.install() as of this migration, so later
+# changes to that module never alter what this migration does.
+CREATE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts USING fts5(
+        title, content,
+        content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_ai AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_ad AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_au AFTER UPDATE OF title, content ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO posts_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')",
+]
+
+DROP_INDEX = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_ai',
+    'DROP TRIGGER IF EXISTS posts_post_fts_ad',
+    'DROP TRIGGER IF EXISTS posts_post_fts_au',
+    'DROP TABLE IF EXISTS posts_post_fts',
+]
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in CREATE_INDEX:
+        schema_editor.execute(statement)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_INDEX:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostScore',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending_score', serialize=False, to='posts.post')),
+                ('score', models.FloatField(default=0)),
+                ('scored_at', models.FloatField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scored_at'], name='postscore_scored_at_idx')],
+            },
+        ),
+    ]
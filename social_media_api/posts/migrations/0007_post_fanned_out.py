@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_unfanned_posts(apps, schema_editor):
+    # Posts by authors above the threshold were merged at read time
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.filter(author__follower_count__gt=settings.TIMELINE_FANOUT_THRESHOLD).update(fanned_out=False)
+
+
+# Remaking posts_post for the new column drops the full-text search triggers
+# installed by 0005; recreate them as they were defined there.
+SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_ai AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_ad AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_au AFTER UPDATE OF title, content ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO posts_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+]
+
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in SEARCH_TRIGGERS:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_postscore'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Unapplying remakes the table again, after the reverse of the last step
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='post',
+            name='fanned_out',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('fanned_out', False)), fields=['author', '-created_at', '-id'], name='post_not_fanned_out_idx'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(mark_unfanned_posts, migrations.RunPython.noop),
+    ]
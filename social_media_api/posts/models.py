@@ -1,6 +1,29 @@
 from django.db import models
+from django.db.models import Prefetch
 from django.conf import settings
 
+class PostQuerySet(models.QuerySet):
+    def visible(self):
+        """
+        Posts whose author is active, hiding those of accounts scheduled for
+        deletion until purge_deleted_accounts reaches them.
+        """
+        return self.filter(author__is_active=True)
+
+    def with_comment_preview(self):
+        """
+        Attach the newest POST_COMMENT_PREVIEW_SIZE comments (as
+        `latest_comments`) to each post. The comments for a whole page are
+        loaded by a single windowed prefetch query instead of one per post.
+        """
+        latest = (
+            Comment.objects.select_related('author')
+            .order_by('-created_at', '-id')[:settings.POST_COMMENT_PREVIEW_SIZE]
+        )
+        return self.prefetch_related(
+            Prefetch('comments', queryset=latest, to_attr='latest_comments')
+        )
+
 class Post(models.Model):
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='posts')
     title = models.CharField(max_length=200)
@@ -8,6 +31,29 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized engagement counters, maintained with F() updates by the
+    # like/comment views. `reconcile_counters` repairs any drift.
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # False if the post was not written into follower timelines because its
+    # author was above TIMELINE_FANOUT_THRESHOLD; feeds merge those at read
+    # time, whatever the author's follower count is now.
+    fanned_out = models.BooleanField(default=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        # Match the (created_at, id) keyset used to paginate posts
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_id_idx'),
+            models.Index(
+                fields=['author', '-created_at', '-id'], name='post_not_fanned_out_idx',
+                condition=models.Q(fanned_out=False),
+            ),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -18,6 +64,12 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='comment_created_id_idx'),
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_post_created_id_idx'),
+        ]
+
     def __str__(self):
         return f'Comment by {self.author} on {self.post}'
     
@@ -30,4 +82,54 @@ class Like(models.Model):
         unique_together = ('post', 'user')  # Prevent multiple likes from same user
 
     def __str__(self):
-        return f"{self.user} liked {self.post}"
\ No newline at end of file
+        return f"{self.user} liked {self.post}"
+
+class TimelineEntry(models.Model):
+    """
+    One row per (follower, post) in a follower's precomputed home timeline.
+
+    Rows are written when a post is created (fan-out on write) so FeedView can
+    read a user's timeline by index instead of re-running the IN-subquery over
+    everyone they follow. `author` and `created_at` are copied from the post so
+    unfollows can be pruned and the timeline ordered without touching posts.
+    Deleting a post cascades to its entries.
+    """
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'post'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='timeline_owner_created_idx'),
+            models.Index(fields=['owner', 'author'], name='timeline_owner_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.post} in {self.owner}'s timeline"
+
+class PostScore(models.Model):
+    """
+    Time-decayed engagement score of a post, maintained by `posts.trending`.
+
+    `score` is the value as of `scored_at` (Unix seconds). Each like or
+    comment first decays it to the current time and then adds the event's
+    weight, so the current score of any row is
+    `score * 2 ** ((scored_at - now) / TRENDING_HALF_LIFE)` without ever
+    rewriting idle rows.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='trending_score')
+    score = models.FloatField(default=0)
+    scored_at = models.FloatField()
+
+    class Meta:
+        # Only rows touched within TRENDING_WINDOW are ranked
+        indexes = [
+            models.Index(fields=['scored_at'], name='postscore_scored_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post} scored {self.score:.2f}'
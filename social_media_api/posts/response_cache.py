@@ -0,0 +1,188 @@
+"""
+Shared cache of anonymous post list/detail responses.
+
+Entries are keyed by host, path and the sorted query string, and stamped
+with the generations they were built from: a post detail with that post's
+generation, a list page with the list generation. `posts.signals` bumps the
+list generation and the affected post's generation after each committed
+write to a post, comment or like, so activity on one post leaves every
+other post's cached detail alone. An entry stamped with an older generation
+is stale, so invalidation never has to find or delete keys.
+
+When an entry is stale or missing, only the request that takes the rebuild
+lock recomputes it. Others serve the stale entry if it is younger than
+RESPONSE_CACHE_STALE_TTL, or wait briefly for the rebuild, so a write to a
+hot post doesn't stampede the database.
+"""
+import hashlib
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial, wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from . import etags
+
+# Seconds between cache polls while waiting for another request's rebuild
+WAIT_INTERVAL = 0.05
+
+# Posts collected by an active batch()
+_batch = ContextVar('response_cache_batch', default=None)
+
+# Bumped by bump_all(); part of every entry's stamp
+ALL_KEY = 'posts:generation'
+LIST_KEY = 'posts:generation:list'
+
+
+def _post_key(post_id):
+    return f'posts:generation:post:{post_id}'
+
+
+def generation(post_id=None):
+    """
+    Current generation of the list responses, or with `post_id` of that
+    post's detail response, as a tuple.
+    """
+    keys = [ALL_KEY, LIST_KEY if post_id is None else _post_key(post_id)]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            # Never restart at a value an older entry may still carry
+            cache.add(key, time.time_ns(), None)
+            values[key] = cache.get(key)
+    return tuple(values[key] for key in keys)
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+def bump(*post_ids):
+    """Mark cached list responses, and the detail of each of `post_ids`, as stale."""
+    _bump(LIST_KEY)
+    for post_id in post_ids:
+        _bump(_post_key(post_id))
+
+
+def bump_all():
+    """Mark every cached response as stale."""
+    _bump(ALL_KEY)
+
+
+def expire(*post_ids):
+    """
+    bump() now, for readers inside the current transaction, and again after
+    commit in case a concurrent request re-cached the pre-write rows
+    meanwhile. Inside batch() the posts are collected instead.
+    """
+    pending = _batch.get()
+    if pending is not None:
+        pending.update(post_ids)
+        return
+    bump(*post_ids)
+    transaction.on_commit(lambda: bump(*post_ids))
+
+
+@contextmanager
+def batch():
+    """
+    Collect the expire() calls made in the block, e.g. by post_delete for
+    every row of a bulk delete, and expire each post once when it exits.
+    """
+    pending = set()
+    token = _batch.set(pending)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+    expire(*pending)
+
+
+def cache_key(request):
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    digest = hashlib.sha256(f'{request.get_host()}{request.path}?{query}'.encode('utf-8')).hexdigest()
+    return f'posts:response:{digest}'
+
+
+def _serve(entry, request):
+    response = etags.not_modified(request, entry['etag'])
+    if response is None:
+        response = Response(entry['data'], status=entry['status'])
+        etags.tag(response, entry['etag'])
+    return response
+
+
+def _wait(key, lock_key, current):
+    deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline and cache.get(lock_key) is not None:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry['generation'] == current:
+            return entry
+    return None
+
+
+def serve(request, compute, post_id=None):
+    """
+    Return the cached response for an anonymous GET, calling `compute()`
+    to build (and store) it when needed. Pass `post_id` for a post's detail
+    response.
+    """
+    if request.method != 'GET' or request.user.is_authenticated:
+        return compute()
+
+    key = cache_key(request)
+    lock_key = f'{key}:lock'
+    current = generation(post_id)
+    entry = cache.get(key)
+    if entry is not None and entry['generation'] == current:
+        return _serve(entry, request)
+
+    if not cache.add(lock_key, True, settings.RESPONSE_CACHE_LOCK_TIMEOUT):
+        # Someone else is rebuilding this response
+        if entry is not None and entry['stored_at'] + settings.RESPONSE_CACHE_STALE_TTL > time.time():
+            return _serve(entry, request)
+        entry = _wait(key, lock_key, current)
+        return _serve(entry, request) if entry is not None else compute()
+
+    try:
+        response = compute()
+        if response.status_code == 200 and isinstance(response, Response):
+            cache.set(key, {
+                'generation': current,
+                'stored_at': time.time(),
+                'status': response.status_code,
+                'data': response.data,
+                'etag': response.get('ETag'),
+            }, settings.RESPONSE_CACHE_TTL)
+        return response
+    finally:
+        cache.delete(lock_key)
+
+
+def anonymous(method):
+    """
+    Serve a view method's anonymous GETs through the response cache. Detail
+    routes are stamped with the generation of the post they look up.
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        compute = partial(method, self, request, *args, **kwargs)
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        if lookup not in kwargs:
+            return serve(request, compute)
+        try:
+            post_id = int(kwargs[lookup])
+        except ValueError:
+            # Not a post ID; there's nothing worth caching
+            return compute()
+        return serve(request, compute, post_id)
+    return wrapper
@@ -0,0 +1,143 @@
+"""
+Full-text search over posts backed by an SQLite FTS5 index.
+
+`posts_post_fts` is an external-content FTS5 table: it stores only the
+inverted index and reads title/content back from `posts_post` by rowid.
+Triggers on `posts_post` keep it in step with every insert, delete and
+title/content update, including bulk writes that bypass model signals.
+Counter updates (`like_count`, `comment_count`) don't touch the indexed
+columns and so never fire the update trigger.
+
+Django rebuilds a table (copy, drop, rename) for some schema changes on
+SQLite, which drops its triggers, so a migration that does so must recreate
+them (see posts/migrations/0007_post_fanned_out.py). The migrations keep
+their own copy of this DDL; `manage.py rebuild_search_index` reinstalls the
+current one and repopulates the index.
+
+On other databases `FullTextSearchFilter` falls back to DRF's
+`SearchFilter` over `PostViewSet.search_fields`.
+"""
+import re
+
+from django.db import connections
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+
+# bm25() weights for the indexed columns: a title hit outranks a body hit
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def is_available(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def install(connection, rebuild=True):
+    """
+    (Re)create the FTS5 table and its sync triggers, then optionally
+    repopulate the index from `posts_post`.
+    """
+    table = Post._meta.db_table
+    statements = [
+        f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+        f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+        f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+        f'DROP TABLE IF EXISTS {FTS_TABLE}',
+        f"""
+        CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+            title, content,
+            content='{table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        """,
+        f"""
+        CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END
+        """,
+        f"""
+        CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+        END
+        """,
+        f"""
+        CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF title, content ON {table} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+            INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END
+        """,
+    ]
+    if rebuild:
+        statements.append(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def match_expression(terms):
+    """
+    Turn raw search terms into an FTS5 query where every word must match,
+    as a prefix. Each word is quoted, so user input can never inject FTS5
+    operators or column filters.
+    """
+    words = [word for term in terms for word in _TOKEN.findall(term)]
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def ranked(queryset, match):
+    """
+    Restrict `queryset` to posts matching `match` and annotate each with
+    its `search_rank` (bm25, lower is better).
+
+    The FTS table is joined rather than queried per row, so SQLite drives
+    the query from the MATCH and reads each hit's rank from the same cursor.
+    """
+    table = Post._meta.db_table
+    rank = RawSQL(f'bm25({FTS_TABLE}, {TITLE_WEIGHT}, {CONTENT_WEIGHT})', [], output_field=FloatField())
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE} MATCH %s', f'{FTS_TABLE}.rowid = "{table}"."id"'],
+        params=[match],
+    ).annotate(search_rank=rank)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for `SearchFilter` that answers `?search=` from the
+    FTS5 index, best match first.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        if not is_available(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+
+        match = match_expression(terms)
+        if not match:
+            return queryset.none()
+        return ranked(queryset, match)
+
+    def get_keyset_ordering(self, request, queryset, view):
+        """Keyset for `KeysetPagination` while a ranked search is active."""
+        if match_expression(self.get_search_terms(request)) and is_available(queryset.db):
+            return ('search_rank', 'id')
+        return None
@@ -1,5 +1,6 @@
 # posts/serializers.py
 from rest_framework import serializers
+from django.conf import settings
 from .models import Post, Comment
 from django.contrib.auth import get_user_model
 
@@ -13,9 +14,19 @@ class CommentSerializer(serializers.ModelSerializer):
 
 class PostSerializer(serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source='author.username')
-    comments = CommentSerializer(many=True, read_only=True)
+    # Only a bounded preview of the thread is embedded; use
+    # /api/posts/{id}/comments/ for the rest.
+    latest_comments = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ['id', 'author', 'title', 'content', 'created_at', 'updated_at', 'comments']
-        read_only_fields = ['created_at', 'updated_at']
\ No newline at end of file
+        fields = ['id', 'author', 'title', 'content', 'created_at', 'updated_at', 'like_count', 'comment_count', 'latest_comments']
+        read_only_fields = ['created_at', 'updated_at', 'like_count', 'comment_count']
+
+    def get_latest_comments(self, obj):
+        # Prefetched by Post.objects.with_comment_preview(); freshly created
+        # posts fall back to a query.
+        comments = getattr(obj, 'latest_comments', None)
+        if comments is None:
+            comments = obj.comments.select_related('author').order_by('-created_at', '-id')[:settings.POST_COMMENT_PREVIEW_SIZE]
+        return CommentSerializer(comments, many=True).data
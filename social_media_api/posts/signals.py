@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import response_cache
+from .models import Comment, Like, Post
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Like)
+def expire_cached_responses(sender, instance, **kwargs):
+    response_cache.expire(instance.pk if sender is Post else instance.post_id)
@@ -1,3 +1,845 @@
-from django.test import TestCase
+import base64
+import json
+import re
+import time
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count, F
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from accounts import follows
+from notifications.models import Notification, NotificationActor, NotificationEvent
+from social_media_api.middleware import QueryTimingMiddleware
+from . import response_cache, timeline, trending
+from .models import Comment, Like, Post, PostScore, TimelineEntry
+
+User = get_user_model()
+
+
+class FeedTimelineTestCase(APITestCase):
+    def setUp(self):
+        """
+        Set up an author with one follower and one non-follower.
+        """
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.follower = User.objects.create_user(username='follower', password='password123')
+        self.stranger = User.objects.create_user(username='stranger', password='password123')
+        follows.follow(self.follower, self.author)
+
+    def create_post(self, title='Hello'):
+        self.client.force_authenticate(self.author)
+        response = self.client.post(reverse('post-list'), {'title': title, 'content': 'World'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Post.objects.get(pk=response.data['id'])
+
+    def feed_titles(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('user_feed'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['title'] for post in response.data['results']]
+
+    def test_create_post_fans_out_to_followers(self):
+        """
+        Creating a post writes it into every follower's timeline only.
+        """
+        post = self.create_post()
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.follower, post=post).exists())
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.stranger).exists())
+        self.assertEqual(self.feed_titles(self.follower), ['Hello'])
+        self.assertEqual(self.feed_titles(self.stranger), [])
+
+    def test_unfollow_prunes_timeline(self):
+        """
+        Unfollowing removes the author's posts from the follower's feed.
+        """
+        self.create_post()
+        self.client.force_authenticate(self.follower)
+        response = self.client.post(reverse('unfollow_user', kwargs={'user_id': self.author.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.feed_titles(self.follower), [])
+
+    def test_follow_backfills_existing_posts(self):
+        """
+        Following an author adds their existing posts to the feed.
+        """
+        self.create_post()
+        self.client.force_authenticate(self.stranger)
+        response = self.client.post(reverse('follow_user', kwargs={'user_id': self.author.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.feed_titles(self.stranger), ['Hello'])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=0)
+    def test_high_follower_authors_are_merged_at_read_time(self):
+        """
+        Authors above the fan-out threshold are not written into timelines
+        but still show up in the feed.
+        """
+        self.create_post()
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed_titles(self.follower), ['Hello'])
+
+    def test_posts_survive_the_author_crossing_the_threshold(self):
+        """
+        Posts keep whether they were fanned out, so dropping below or rising
+        above the threshold later loses none of them.
+        """
+        with override_settings(TIMELINE_FANOUT_THRESHOLD=0):
+            self.create_post('Merged')
+        self.create_post('Fanned out')
+        self.assertEqual(self.feed_titles(self.follower), ['Fanned out', 'Merged'])
+        with override_settings(TIMELINE_FANOUT_THRESHOLD=0):
+            self.assertEqual(self.feed_titles(self.follower), ['Fanned out', 'Merged'])
+            self.client.force_authenticate(self.stranger)
+            self.client.post(reverse('follow_user', kwargs={'user_id': self.author.pk}))
+            self.assertEqual(self.feed_titles(self.stranger), ['Fanned out', 'Merged'])
+
+    def test_feed_page_is_a_timeline_index_range(self):
+        """
+        Without merged authors a feed page is read through the timeline
+        index, without sorting the user's whole timeline.
+        """
+        for i in range(3):
+            self.create_post(f'Post {i}')
+        self.client.force_authenticate(self.follower)
+        url = reverse('user_feed') + '?page_size=2'
+        next_url = self.client.get(url).data['next']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(next_url)
+        self.assertEqual([post['title'] for post in response.data['results']], ['Post 0'])
+        page_sql = next(q['sql'] for q in queries if 'LIMIT 3' in q['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {page_sql}')
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('timeline_owner_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class KeysetPaginationTestCase(APITestCase):
+    def setUp(self):
+        """
+        Create posts that share a created_at so ordering falls back to id.
+        """
+        self.author = User.objects.create_user(username='author', password='password123')
+        for i in range(5):
+            Post.objects.create(author=self.author, title=f'Post {i}', content='Body')
+        Post.objects.update(created_at=Post.objects.first().created_at)
+
+    def test_pages_walk_forward_and_back_without_count(self):
+        """
+        Cursors step through tied rows in (created_at, id) order both ways,
+        and no page issues a COUNT(*).
+        """
+        url = reverse('post-list') + '?page_size=2'
+        seen = []
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertNotIn('count', response.data)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        self.assertIsNone(response.data['previous'])
+        while True:
+            seen.extend(post['title'] for post in response.data['results'])
+            if not response.data['next']:
+                break
+            last_page = response
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, [f'Post {i}' for i in reversed(range(5))])
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(response.data['results'], last_page.data['results'])
+
+    def test_next_page_starts_its_index_range_at_the_cursor(self):
+        """
+        The cursor's leading field bounds the scan, so a deep page seeks into
+        the (created_at, id) index instead of filtering it from the top.
+        """
+        next_url = self.client.get(reverse('post-list') + '?page_size=2').data['next']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(next_url)
+        page_sql = next(q['sql'] for q in queries if 'LIMIT 3' in q['sql'])
+        self.assertIn('"posts_post"."created_at" <= ', page_sql)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {page_sql}')
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('post_created_id_idx (created_at<?)', plan)
+        self.assertNotIn('MULTI-INDEX OR', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse('post-list') + '?cursor=bogus')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursor_values_return_404(self):
+        """Well-formed cursors whose values do not fit the ordering fields are rejected."""
+        self.client.force_authenticate(self.author)
+        for position in (['garbage', 1], [None, 1], [{'x': 1}, 1], ['2024-01-01T00:00:00', 'x']):
+            payload = json.dumps({'r': 0, 'p': position}).encode('utf-8')
+            cursor = base64.b64encode(payload, altchars=b'-_').decode('ascii')
+            for url in (reverse('post-list'), reverse('notifications_list')):
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, (url, position))
+
+
+class CommentPreviewTestCase(APITestCase):
+    def setUp(self):
+        """
+        Create a few posts that each have more comments than the preview shows.
+        """
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.posts = [
+            Post.objects.create(author=self.author, title=f'Post {i}', content='Body') for i in range(4)
+        ]
+        for post in self.posts:
+            for j in range(5):
+                Comment.objects.create(post=post, author=self.author, content=f'Comment {j}')
+        call_command('reconcile_counters', stdout=StringIO())
+
+    @override_settings(POST_COMMENT_PREVIEW_SIZE=2)
+    def test_list_embeds_bounded_preview_in_constant_queries(self):
+        """
+        Each post carries its comment count and only the newest comments,
+        loaded for the whole page in one prefetch.
+        """
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('post-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for post in response.data['results']:
+            self.assertEqual(post['comment_count'], 5)
+            self.assertEqual(
+                [comment['content'] for comment in post['latest_comments']],
+                ['Comment 4', 'Comment 3'],
+            )
+
+    def test_comments_endpoint_pages_full_thread(self):
+        """
+        /api/posts/{id}/comments/ pages through every comment of one post.
+        """
+        url = reverse('post-comments', kwargs={'pk': self.posts[0].pk}) + '?page_size=3'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNone(response.data['next'])
+
+    def test_comments_endpoint_unknown_post_returns_404(self):
+        response = self.client.get(reverse('post-comments', kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class EngagementCounterTestCase(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.reader = User.objects.create_user(username='reader', password='password123')
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+        self.client.force_authenticate(self.reader)
+
+    def test_like_and_unlike_update_like_count(self):
+        """
+        Liking and unliking adjust Post.like_count; repeats are no-ops.
+        """
+        like_url = reverse('like_post', kwargs={'pk': self.post.pk})
+        unlike_url = reverse('unlike_post', kwargs={'pk': self.post.pk})
+        self.client.post(like_url)
+        self.client.post(like_url)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+        self.client.post(unlike_url)
+        self.client.post(unlike_url)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_comment_create_and_delete_update_comment_count(self):
+        response = self.client.post(reverse('comment-list'), {'post': self.post.pk, 'content': 'Nice'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+        self.client.delete(reverse('comment-detail', kwargs={'pk': response.data['id']}))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_reconcile_counters_repairs_drift(self):
+        """
+        reconcile_counters recomputes counters that drifted from the real rows.
+        """
+        Like.objects.create(post=self.post, user=self.reader)
+        Post.objects.filter(pk=self.post.pk).update(comment_count=7)
+        self.reader.following.add(self.author)
+
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+
+        self.post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.reader.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 0))
+        self.assertEqual((self.author.follower_count, self.reader.following_count), (1, 1))
+
+
+class FullTextSearchTestCase(APITestCase):
+    def setUp(self):
+        """
+        Create posts that match a search in the title, the body or not at all.
+        """
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.body_hit = Post.objects.create(author=self.author, title='Weekend', content='Notes on Django signals')
+        self.title_hit = Post.objects.create(author=self.author, title='Django tips', content='Short and sweet')
+        self.miss = Post.objects.create(author=self.author, title='Cooking', content='Pasta recipes')
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('post-list'), {'search': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_results_are_ranked_with_title_hits_first(self):
+        """
+        Matches are ordered by bm25 rank, weighting titles above bodies.
+        """
+        response = self.search('django')
+        self.assertEqual([post['id'] for post in response.data['results']], [self.title_hit.pk, self.body_hit.pk])
+
+    def test_prefix_and_multi_word_queries(self):
+        """
+        Every word must match, each as a prefix.
+        """
+        response = self.search('djan sig')
+        self.assertEqual([post['id'] for post in response.data['results']], [self.body_hit.pk])
+
+    def test_index_follows_updates_and_deletes(self):
+        """
+        Triggers keep the index in step with edits and deletions.
+        """
+        Post.objects.filter(pk=self.miss.pk).update(content='Django for dinner')
+        self.title_hit.delete()
+        ids = {post['id'] for post in self.search('django').data['results']}
+        self.assertEqual(ids, {self.body_hit.pk, self.miss.pk})
+
+    def test_operators_in_input_are_treated_as_words(self):
+        response = self.search('"cook*) ^pasta:')
+        self.assertEqual([post['id'] for post in response.data['results']], [self.miss.pk])
+        self.assertEqual(self.search('"*"').data['results'], [])
+
+    def test_ranked_results_page_with_keyset_cursor(self):
+        """
+        Search results page on (rank, id) cursors without repeats or gaps.
+        """
+        for i in range(3):
+            Post.objects.create(author=self.author, title=f'Django {i}', content='Body')
+        response = self.search('django', page_size=2)
+        seen = []
+        while True:
+            seen.extend(post['id'] for post in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+        self.assertEqual(seen[-1], self.body_hit.pk)
+
+    def test_search_is_driven_by_the_fts_index(self):
+        """
+        The page query reads matches and their rank from one FTS scan instead
+        of running a bm25 subquery per candidate row.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.search('django')
+        page_sql = next(q['sql'] for q in queries if 'bm25' in q['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {page_sql}')
+            plan = [row[-1] for row in cursor.fetchall()]
+        self.assertTrue(plan[0].startswith('SCAN posts_post_fts VIRTUAL TABLE'), plan)
+        self.assertFalse(any('SUBQUERY' in step for step in plan), plan)
+
+    def test_rebuild_search_index_restores_lost_triggers(self):
+        """
+        rebuild_search_index repopulates the index from posts_post.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_ai')
+        late = Post.objects.create(author=self.author, title='Django late', content='Body')
+        self.assertNotIn(late.pk, [post['id'] for post in self.search('late').data['results']])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual([post['id'] for post in self.search('late').data['results']], [late.pk])
+
+
+@override_settings(TRENDING_HALF_LIFE=3600, TRENDING_WINDOW=4 * 3600, TRENDING_WEIGHTS={'like': 1.0, 'comment': 2.0})
+class TrendingPostsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.readers = [User.objects.create_user(username=f'reader{i}', password='password123') for i in range(2)]
+        self.posts = [Post.objects.create(author=self.author, title=f'Post {i}', content='Body') for i in range(3)]
+
+    def like(self, user, post):
+        self.client.force_authenticate(user)
+        self.client.post(reverse('like_post', kwargs={'pk': post.pk}))
+
+    def comment(self, user, post):
+        self.client.force_authenticate(user)
+        response = self.client.post(reverse('comment-list'), {'post': post.pk, 'content': 'Nice'})
+        return response.data['id']
+
+    def trending_ids(self, **params):
+        response = self.client.get(reverse('post-trending'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['id'] for post in response.data]
+
+    def test_likes_and_comments_rank_posts(self):
+        """
+        Scores add up the weights of each post's likes and comments.
+        """
+        first, second, third = self.posts
+        self.like(self.readers[0], first)
+        self.like(self.readers[1], first)
+        self.comment(self.readers[0], first)
+        self.comment(self.readers[0], second)
+        self.like(self.readers[0], third)
+        self.assertEqual(self.trending_ids(), [first.pk, second.pk, third.pk])
+        self.assertEqual(self.trending_ids(limit=1), [first.pk])
+
+    def test_unlike_and_comment_delete_take_weight_back(self):
+        self.like(self.readers[0], self.posts[0])
+        comment_id = self.comment(self.readers[0], self.posts[0])
+        self.client.post(reverse('unlike_post', kwargs={'pk': self.posts[0].pk}))
+        self.client.delete(reverse('comment-detail', kwargs={'pk': comment_id}))
+        self.assertAlmostEqual(PostScore.objects.get(post=self.posts[0]).score, 0.0, places=3)
+        self.assertEqual(self.trending_ids(), [])
+
+    def test_scores_decay_and_expire_outside_window(self):
+        """
+        Older activity counts for less, halving every half-life, and posts
+        idle for longer than the window drop out.
+        """
+        now = time.time()
+        old, recent, expired = self.posts
+        PostScore.objects.create(post=old, score=10.0, scored_at=now - 2 * 3600)
+        PostScore.objects.create(post=recent, score=3.0, scored_at=now)
+        PostScore.objects.create(post=expired, score=1000.0, scored_at=now - 5 * 3600)
+        self.assertEqual(self.trending_ids(), [recent.pk, old.pk])
+
+        trending.record(old.pk, 'like')
+        self.assertAlmostEqual(PostScore.objects.get(post=old).score, 3.5, places=2)
+
+    def test_unliking_an_old_like_takes_back_only_its_decayed_weight(self):
+        """
+        A like from two half-lives ago only contributes a quarter of its
+        weight now, so retracting it leaves newer activity in place.
+        """
+        post = self.posts[0]
+        self.like(self.readers[0], post)
+        Like.objects.filter(post=post).update(created_at=timezone.now() - timedelta(hours=2))
+        PostScore.objects.filter(post=post).update(score=0.25, scored_at=time.time())
+        self.comment(self.readers[1], post)
+
+        self.client.force_authenticate(self.readers[0])
+        self.client.post(reverse('unlike_post', kwargs={'pk': post.pk}))
+        self.assertAlmostEqual(PostScore.objects.get(post=post).score, 2.0, places=2)
+
+    def test_refresh_lock_is_left_to_its_holder(self):
+        """
+        A reader that found another refresh in progress must not release
+        that refresh's lock on its way out.
+        """
+        cache.set(trending.CACHE_KEY, {'computed_at': 0, 'posts': []})
+        cache.set(trending.LOCK_KEY, True)
+        self.assertEqual(trending.top(), [])
+        self.assertTrue(cache.get(trending.LOCK_KEY))
+
+        cache.delete(trending.LOCK_KEY)
+        trending.top()
+        self.assertIsNone(cache.get(trending.LOCK_KEY))
+
+    def test_reads_are_served_from_cached_top_k(self):
+        """
+        Between refreshes the endpoint reads the cached list: new activity
+        only shows after the next refresh, and a read costs two queries.
+        """
+        self.like(self.readers[0], self.posts[0])
+        self.assertEqual(self.trending_ids(), [self.posts[0].pk])
+
+        self.like(self.readers[0], self.posts[1])
+        self.like(self.readers[1], self.posts[1])
+        with self.assertNumQueries(2):
+            self.assertEqual(self.trending_ids(), [self.posts[0].pk])
+
+        call_command('refresh_trending', stdout=StringIO())
+        self.assertEqual(self.trending_ids(), [self.posts[1].pk, self.posts[0].pk])
+
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.reader = User.objects.create_user(username='reader', password='password123')
+        follows.follow(self.reader, self.author)
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+        timeline.fan_out_post(self.post)
+
+    def test_post_detail_answers_if_none_match_with_304(self):
+        """
+        A matching ETag gets a bodiless 304 from a single validator query.
+        """
+        self.client.force_authenticate(self.reader)
+        url = reverse('post-detail', kwargs={'pk': self.post.pk})
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_post_etag_changes_with_edits_and_engagement(self):
+        url = reverse('post-detail', kwargs={'pk': self.post.pk})
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(self.reader)
+        self.client.post(reverse('like_post', kwargs={'pk': self.post.pk}))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unknown_post_still_returns_404(self):
+        response = self.client.get(reverse('post-detail', kwargs={'pk': 999}), HTTP_IF_NONE_MATCH='"x"')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_feed_page_answers_if_none_match_until_it_changes(self):
+        """
+        Feed pages validate from their post IDs and versions: unchanged
+        pages get a 304 and a new post in the feed yields a new ETag.
+        """
+        self.client.force_authenticate(self.reader)
+        etag = self.client.get(reverse('user_feed'))['ETag']
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('user_feed'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        timeline.fan_out_post(Post.objects.create(author=self.author, title='Again', content='World'))
+        response = self.client.get(reverse('user_feed'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['title'], 'Again')
+
+
+class AnonymousResponseCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+
+    def test_anonymous_reads_are_cached_per_normalized_query(self):
+        """
+        Repeat anonymous GETs, with query parameters in any order, are
+        answered from the cache without touching the database.
+        """
+        url = reverse('post-list')
+        self.client.get(url, {'page_size': 5, 'search': 'hello'})
+        with self.assertNumQueries(0):
+            response = self.client.get(url + '?search=hello&page_size=5')
+        self.assertEqual([post['id'] for post in response.data['results']], [self.post.pk])
+
+        detail = reverse('post-detail', kwargs={'pk': self.post.pk})
+        etag = self.client.get(detail)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_writes_bump_generations_and_expire_responses(self):
+        """
+        Post, comment and like writes each make cached responses stale.
+        """
+        url = reverse('post-detail', kwargs={'pk': self.post.pk})
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=self.author, content='First')
+        self.assertEqual(len(self.client.get(url).data['latest_comments']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.filter(pk=self.post.pk).update(like_count=1)
+            Like.objects.create(post=self.post, user=self.author)
+        self.assertEqual(self.client.get(url).data['like_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Edited'
+            self.post.save()
+        self.assertEqual(self.client.get(url).data['title'], 'Edited')
+
+    def test_activity_on_one_post_keeps_other_details_cached(self):
+        """
+        A like expires the liked post's detail and the list pages, but other
+        posts' cached details stay valid.
+        """
+        other = Post.objects.create(author=self.author, title='Other', content='World')
+        detail = reverse('post-detail', kwargs={'pk': self.post.pk})
+        other_detail = reverse('post-detail', kwargs={'pk': other.pk})
+        for url in (detail, other_detail, reverse('post-list')):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(post=self.post, user=self.author)
+        with self.assertNumQueries(0):
+            self.client.get(other_detail)
+        for url in (detail, reverse('post-list')):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            self.assertTrue(queries, url)
+
+    def test_authenticated_requests_bypass_the_cache(self):
+        self.client.get(reverse('post-list'))
+        self.client.force_authenticate(self.author)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('post-list'))
+
+    def test_stale_entry_is_served_while_another_request_rebuilds(self):
+        """
+        With the rebuild lock held elsewhere, a stale entry is served as is
+        instead of every request recomputing it.
+        """
+        url = reverse('post-list')
+        self.client.get(url)
+        Post.objects.create(author=self.author, title='New', content='World')
+        cache.add(response_cache.cache_key(RequestFactory().get(url)) + ':lock', True)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual([post['title'] for post in response.data['results']], ['Hello'])
+
+
+class BulkPostCreateTestCase(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.follower = User.objects.create_user(username='follower', password='password123')
+        follows.follow(self.follower, self.author)
+        self.client.force_authenticate(self.author)
+
+    @override_settings(POST_BULK_BATCH_SIZE=2)
+    def test_valid_items_are_created_in_batches(self):
+        """
+        Every item is inserted, a batch per POST_BULK_BATCH_SIZE rows, and
+        fanned out to followers.
+        """
+        items = [{'title': f'Post {i}', 'content': 'Body'} for i in range(5)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('post-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "posts_post"')]
+        self.assertEqual(len(inserts), 3)
+
+        ids = [result['id'] for result in response.data['results']]
+        self.assertEqual(
+            list(Post.objects.filter(pk__in=ids).order_by('pk').values_list('title', flat=True)),
+            [item['title'] for item in items],
+        )
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.follower).count(), 5)
+
+    def test_invalid_items_are_reported_without_dropping_valid_ones(self):
+        items = [
+            {'title': 'Good', 'content': 'Body'},
+            {'title': 'x' * 300, 'content': 'Body'},
+            {'content': 'No title'},
+            {'title': 'Also good', 'content': 'Body'},
+        ]
+        response = self.client.post(reverse('post-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], [201, 400, 400, 201])
+        self.assertIn('title', results[1]['errors'])
+        self.assertEqual(set(Post.objects.values_list('title', flat=True)), {'Good', 'Also good'})
+
+    def test_rejects_non_lists_and_unauthenticated_requests(self):
+        response = self.client.post(reverse('post-bulk'), {'title': 'One'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('post-bulk'), [{'content': 'Body'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(None)
+        response = self.client.post(reverse('post-bulk'), [{'title': 'One', 'content': 'Body'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    Fixed query budgets for the post endpoints. The number of queries must
+    not grow with the page size; a failure here usually means an N+1 crept
+    into PostSerializer or a view's queryset.
+    """
+    PAGE_SIZES = (1, 20, 100)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', password='password123')
+        cls.reader = User.objects.create_user(username='reader', password='password123')
+        follows.follow(cls.reader, cls.author)
+        posts = Post.objects.bulk_create(
+            Post(author=cls.author, title=f'Post {i}', content='Body') for i in range(max(cls.PAGE_SIZES) + 1)
+        )
+        Comment.objects.bulk_create(
+            Comment(post=post, author=cls.reader, content=f'Comment {j}') for post in posts for j in range(2)
+        )
+        timeline.fan_out_posts(posts)
+        cls.post = posts[0]
+
+    def setUp(self):
+        # Authenticated requests bypass the anonymous response cache
+        self.client.force_authenticate(self.reader)
+
+    def assertPageBudget(self, url, budget, **params):
+        for page_size in self.PAGE_SIZES:
+            with self.subTest(page_size=page_size):
+                with self.assertNumQueries(budget):
+                    response = self.client.get(url, {'page_size': page_size, **params})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(len(response.data['results']), page_size)
+
+    def test_post_list_budget(self):
+        """Posts, then one prefetch for every comment preview on the page."""
+        self.assertPageBudget(reverse('post-list'), 2)
+
+    def test_post_search_budget(self):
+        self.assertPageBudget(reverse('post-list'), 2, search='post')
+
+    def test_feed_budget(self):
+        """High-follower authors, the ETag validator, posts, comment previews."""
+        self.assertPageBudget(reverse('user_feed'), 4)
+
+    def test_post_comments_budget(self):
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.reader, content='More') for _ in range(max(self.PAGE_SIZES))
+        )
+        self.assertPageBudget(reverse('post-comments', kwargs={'pk': self.post.pk}), 2)
+
+    def test_post_detail_budget(self):
+        """The ETag validator, the post, its comment preview."""
+        with self.assertNumQueries(3):
+            self.client.get(reverse('post-detail', kwargs={'pk': self.post.pk}))
+
+    @override_settings(DEBUG=True, QUERY_TIMING_SLOWEST=2)
+    def test_server_timing_reports_queries_in_debug(self):
+        """
+        In DEBUG mode the response reports the query count, total SQL time
+        and the slowest statements.
+        """
+        response = self.client.get(reverse('post-list'), {'page_size': 5})
+        header = response['Server-Timing']
+        self.assertRegex(header, r'^db;dur=\d+\.\d+;desc="2 queries", ')
+        self.assertEqual(re.findall(r', (sql-\d+);dur=\d+\.\d+;desc="SELECT ', header), ['sql-1', 'sql-2'])
+
+    @override_settings(DEBUG=True)
+    async def test_server_timing_runs_in_async_chains(self):
+        """
+        Under ASGI the middleware awaits the view directly and still counts
+        the queries it runs through sync_to_async.
+        """
+        async def view(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(QueryTimingMiddleware(view)))
+        await sync_to_async(User.objects.create_user)(username='timed', password='password123')
+        response = await self.async_client.post(
+            reverse('login_async'), {'username': 'timed', 'password': 'password123'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=\d+\.\d+;desc="[1-9]\d* queries"')
+
+    def test_server_timing_is_off_outside_debug(self):
+        response = self.client.get(reverse('post-list'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class LoadTestingCommandsTestCase(APITestCase):
+    def seed(self, **options):
+        call_command(
+            'seed_social_graph', users=30, following=5, posts=2, comments=1, likes=3,
+            stdout=StringIO(), **options
+        )
+
+    def test_seed_builds_a_consistent_graph(self):
+        """Counters, timelines and notifications agree with the rows created."""
+        self.seed()
+        users = User.objects.filter(username__startswith='seed_')
+        self.assertEqual(users.count(), 30)
+        self.assertTrue(Post.objects.exists())
+        for post in Post.objects.all():
+            self.assertEqual(post.like_count, post.likes.count())
+            self.assertEqual(post.comment_count, post.comments.count())
+        for user in users:
+            self.assertEqual(user.follower_count, user.followers.count())
+        self.assertEqual(
+            TimelineEntry.objects.count(),
+            sum(post.author.follower_count for post in Post.objects.select_related('author')),
+        )
+        notifications = Notification.objects.annotate(actors_seen=Count('actors'))
+        self.assertTrue(notifications.exists())
+        self.assertEqual(set(notifications.values_list('verb', flat=True)), {'liked your post'})
+        for notification in notifications:
+            self.assertEqual(notification.actor_count, notification.actors_seen)
+        self.assertEqual(
+            NotificationActor.objects.count(),
+            Like.objects.exclude(user=F('post__author')).count(),
+        )
+
+    def test_seed_is_reproducible_and_refuses_to_reuse_a_prefix(self):
+        self.seed()
+        first = list(Post.objects.order_by('pk').values_list('title', flat=True))
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.seed(prefix='again')
+        second = list(Post.objects.filter(author__username__startswith='again_').order_by('pk')
+                      .values_list('title', flat=True))
+        self.assertEqual(first, second)
+
+    def test_benchmark_reports_latency_percentiles(self):
+        """
+        Every endpoint is measured, and the run leaves likes, trending
+        scores, the notification outbox and tokens as it found them.
+        """
+        self.seed()
+        likes = set(Like.objects.values_list('user_id', 'post_id'))
+        scores = set(PostScore.objects.values_list('post_id', 'score', 'scored_at'))
+        tokens = set(Token.objects.values_list('key', flat=True))
+        out = StringIO()
+        call_command('benchmark_endpoints', requests=5, warmup=1, users=5, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(
+            set(report['endpoints']),
+            {'feed', 'posts', 'posts_anonymous', 'post_detail', 'notifications', 'like', 'unlike'},
+        )
+        for name, result in report['endpoints'].items():
+            self.assertEqual(result['requests'], 5)
+            self.assertEqual(list(result['status_codes']), ['200'], name)
+            latency = result['latency_ms']
+            self.assertLessEqual(latency['p50'], latency['p95'])
+            self.assertLessEqual(latency['p95'], latency['p99'])
+        self.assertEqual(set(Like.objects.values_list('user_id', 'post_id')), likes)
+        self.assertEqual(set(PostScore.objects.values_list('post_id', 'score', 'scored_at')), scores)
+        self.assertFalse(NotificationEvent.objects.exists())
+        self.assertEqual(set(Token.objects.values_list('key', flat=True)), tokens)
+
+    def test_seed_backdates_activity(self):
+        """
+        Timestamps are spread over --days and comments and likes come after
+        their post, while the models keep their auto_now behaviour.
+        """
+        self.seed(days=10)
+        created = list(Post.objects.values_list('created_at', flat=True))
+        self.assertLess(min(created), timezone.now() - timedelta(days=1))
+        self.assertFalse(Comment.objects.filter(created_at__lt=F('post__created_at')).exists())
+        self.assertFalse(Like.objects.filter(created_at__lt=F('post__created_at')).exists())
+        self.assertTrue(Post._meta.get_field('created_at').auto_now_add)
@@ -0,0 +1,136 @@
+"""
+Fan-out-on-write home timelines.
+
+Every post is copied into a TimelineEntry row for each of its author's
+followers when it is created, so reading a feed is an index range scan on
+(owner, created_at) instead of an IN-subquery over everyone the reader follows.
+
+Authors with more than TIMELINE_FANOUT_THRESHOLD followers are not fanned out:
+writing one row per follower would make every post they publish expensive.
+Such posts are flagged `fanned_out=False` and merged into the feed at read
+time instead (hybrid mode). The flag is per post, so an author crossing the
+threshold in either direction never drops posts from their followers' feeds.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F, Q
+
+from accounts.models import Follow
+from .models import Post, TimelineEntry
+
+
+def is_fanout_author(author_id):
+    """Return True if posts by this author are written into follower timelines."""
+    return get_user_model().objects.filter(
+        pk=author_id, follower_count__lte=settings.TIMELINE_FANOUT_THRESHOLD
+    ).exists()
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=settings.TIMELINE_BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def fan_out_post(post):
+    """Write `post` into the timeline of every follower of its author."""
+    fan_out_posts([post])
+
+
+def fan_out_posts(posts):
+    """
+    Write `posts`, all by the same author, into the timeline of every
+    follower of that author, reading the follower list once.
+    """
+    if not posts:
+        return
+    if not is_fanout_author(posts[0].author_id):
+        Post.objects.filter(pk__in=[post.pk for post in posts]).update(fanned_out=False)
+        for post in posts:
+            post.fanned_out = False
+        return
+
+    follower_ids = Follow.objects.filter(
+        from_customuser_id=posts[0].author_id
+    ).values_list('to_customuser_id', flat=True)
+
+    batch = []
+    for follower_id in follower_ids.iterator(chunk_size=settings.TIMELINE_BATCH_SIZE):
+        for post in posts:
+            batch.append(TimelineEntry(
+                owner_id=follower_id,
+                post_id=post.pk,
+                author_id=post.author_id,
+                created_at=post.created_at,
+            ))
+        if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+            _bulk_insert(batch)
+            batch = []
+    if batch:
+        _bulk_insert(batch)
+
+
+def add_authors(owner_id, author_ids):
+    """
+    Copy existing fanned-out posts by `author_ids` into `owner_id`'s
+    timeline, e.g. after a follow. The others are merged at read time.
+    """
+    if not author_ids:
+        return
+
+    posts = Post.objects.filter(author_id__in=author_ids, fanned_out=True).values_list('pk', 'author_id', 'created_at')
+    batch = []
+    for post_id, author_id, created_at in posts.iterator(chunk_size=settings.TIMELINE_BATCH_SIZE):
+        batch.append(TimelineEntry(
+            owner_id=owner_id, post_id=post_id, author_id=author_id, created_at=created_at,
+        ))
+        if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+            _bulk_insert(batch)
+            batch = []
+    if batch:
+        _bulk_insert(batch)
+
+
+def remove_authors(owner_id, author_ids):
+    """Drop every post by `author_ids` from `owner_id`'s timeline, e.g. after an unfollow."""
+    TimelineEntry.objects.filter(owner_id=owner_id, author_id__in=author_ids).delete()
+
+
+def rebuild(owner_id):
+    """Rebuild a user's timeline from scratch from the accounts they follow."""
+    TimelineEntry.objects.filter(owner_id=owner_id).delete()
+    following_ids = Follow.objects.filter(
+        to_customuser_id=owner_id
+    ).values_list('from_customuser_id', flat=True)
+    add_authors(owner_id, list(following_ids))
+
+
+def unfanned_authors(user):
+    """IDs of accounts `user` follows that have posts merged at read time."""
+    return list(
+        user.following.filter(posts__fanned_out=False).distinct().values_list('pk', flat=True)
+    )
+
+
+def feed_queryset(user):
+    """
+    Posts for `user`'s home feed, annotated with the `feed_at`/`feed_id`
+    keyset the feed is paginated by.
+
+    Normally that is the timeline alone: the posts are read through their
+    TimelineEntry rows and the keyset is the entry's own (created_at, post),
+    so a page is a range of the (owner, -created_at, -post) index. In hybrid
+    mode the not fanned-out posts of followed authors are merged in, and
+    the same values are read from the post row.
+    """
+    posts = Post.objects.visible().select_related('author')
+    author_ids = unfanned_authors(user)
+    if not author_ids:
+        return posts.filter(timeline_entries__owner=user).annotate(
+            feed_at=F('timeline_entries__created_at'), feed_id=F('timeline_entries__post'),
+        )
+
+    timeline = TimelineEntry.objects.filter(owner_id=user.pk).values('post_id')
+    return posts.filter(Q(pk__in=timeline) | Q(author_id__in=author_ids, fanned_out=False)).annotate(
+        feed_at=F('created_at'), feed_id=F('id'),
+    )
@@ -0,0 +1,103 @@
+"""
+Trending posts ranked by time-decayed like/comment activity.
+
+Every like or comment write calls `record()`, which decays the post's stored
+`PostScore` to the current time and adds the event's weight in one UPDATE.
+Removing a like or comment subtracts what that event still contributes,
+decayed from its own timestamp, so like/unlike loops can't inflate a score
+and retracting an old like doesn't wipe out newer activity.
+
+Ranking happens in `refresh()`, which scores only posts active within
+TRENDING_WINDOW and caches the best TRENDING_TOP_K. `top()` serves that
+cached list and triggers at most one refresh per TRENDING_REFRESH_INTERVAL;
+other readers keep getting the previous list while it runs. Run
+`manage.py refresh_trending --loop` to keep the list warm off the request path.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Greatest, Power
+
+from .models import PostScore
+
+CACHE_KEY = 'posts:trending'
+LOCK_KEY = 'posts:trending:refreshing'
+# Retracting every event can leave float residue rather than an exact zero
+MIN_SCORE = 1e-6
+
+
+def _decayed(now):
+    """Expression for a row's score decayed to `now`."""
+    elapsed = F('scored_at') - Value(now, output_field=FloatField())
+    return F('score') * Power(Value(2.0), elapsed / settings.TRENDING_HALF_LIFE)
+
+
+def _weight_at(weight, at, since):
+    """Expression for `weight` added at `at`, decayed to the time `since`."""
+    elapsed = Value(at, output_field=FloatField()) - since
+    return weight * Power(Value(2.0), elapsed / settings.TRENDING_HALF_LIFE)
+
+
+def record(post_id, event, undo=False, at=None):
+    """
+    Add (or, with `undo`, remove) one `event` ('like' or 'comment') to the
+    post's score. `at` is when the event happened (default now); pass the
+    like's or comment's `created_at` when undoing it. Call inside the
+    transaction that writes the event.
+    """
+    weight = settings.TRENDING_WEIGHTS[event]
+    now = time.time()
+    at = now if at is None else min(at.timestamp(), now)
+    scores = PostScore.objects.filter(post_id=post_id)
+    if undo:
+        # Take off only what the event still contributes at the stored
+        # scored_at, leaving scored_at alone so the post doesn't look active
+        contribution = _weight_at(weight, at, F('scored_at'))
+        scores.update(score=Greatest(F('score') - contribution, Value(0.0)))
+        return
+
+    score = _decayed(now) + _weight_at(weight, at, Value(now, output_field=FloatField()))
+    if scores.update(score=score, scored_at=now):
+        return
+    try:
+        with transaction.atomic():
+            initial = weight * 2 ** ((at - now) / settings.TRENDING_HALF_LIFE)
+            PostScore.objects.create(post_id=post_id, score=initial, scored_at=now)
+    except IntegrityError:
+        # A concurrent writer created the row first; apply ours on top
+        scores.update(score=score, scored_at=now)
+
+
+def refresh():
+    """Recompute and cache the top posts as a list of (post_id, score)."""
+    now = time.time()
+    ranked = (
+        PostScore.objects.filter(scored_at__gte=now - settings.TRENDING_WINDOW, score__gt=MIN_SCORE)
+        .annotate(current=_decayed(now))
+        .order_by('-current', '-post_id')
+        .values_list('post_id', 'current')[:settings.TRENDING_TOP_K]
+    )
+    top_posts = list(ranked)
+    cache.set(CACHE_KEY, {'computed_at': now, 'posts': top_posts}, settings.TRENDING_WINDOW)
+    return top_posts
+
+
+def top():
+    """The cached (post_id, score) list, best first, refreshed when stale."""
+    entry = cache.get(CACHE_KEY)
+    locked = False
+    if entry is not None:
+        if entry['computed_at'] + settings.TRENDING_REFRESH_INTERVAL > time.time():
+            return entry['posts']
+        locked = cache.add(LOCK_KEY, True, settings.TRENDING_REFRESH_INTERVAL)
+        if not locked:
+            return entry['posts']
+    try:
+        return refresh()
+    finally:
+        # Only the caller that took the lock may release it
+        if locked:
+            cache.delete(LOCK_KEY)
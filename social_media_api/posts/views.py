@@ -1,38 +1,198 @@
-from rest_framework import viewsets, permissions, filters, generics, status
+from rest_framework import viewsets, permissions, generics, status
 from .models import Post, Comment, Like
 from .serializers import PostSerializer, CommentSerializer
 from .permissions import IsAuthorOrReadOnly
+from .search import FullTextSearchFilter
+from . import etags, response_cache, timeline, trending
 from django.shortcuts import get_object_or_404
-from notifications.models import Notification
+from notifications import outbox
 from rest_framework.response import Response
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.conf import settings
+from social_media_api.pagination import KeysetPagination
 
 class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.all().order_by('-created_at')
+    queryset = Post.objects.visible().order_by('-created_at', '-id')
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
-    filter_backends = [filters.SearchFilter]
+    # FTS5-ranked search on SQLite; search_fields serve the fallback elsewhere
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['title', 'content']
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('author').with_comment_preview()
+
+    @response_cache.anonymous
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @response_cache.anonymous
+    def retrieve(self, request, *args, **kwargs):
+        # Answer If-None-Match from the validator alone, before loading the post
+        etag = etags.post_etag(request, kwargs[self.lookup_field])
+        response = etags.not_modified(request, etag)
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        return etags.tag(response, etag)
+
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        timeline.fan_out_post(post)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        POST /api/posts/bulk/ [{"title": ..., "content": ...}, ...]
+        - Create many posts at once. Valid items are inserted with
+          bulk_create in batches of POST_BULK_BATCH_SIZE inside one
+          transaction; invalid ones are reported without affecting the rest.
+          Returns one result per item, in input order: 201 if every item was
+          created, 207 if only some were, 400 if none.
+        """
+        serializer = self.get_serializer(data=request.data, many=True)
+        if not isinstance(request.data, list) or not request.data:
+            return Response({'detail': 'Expected a non-empty list of posts.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > settings.POST_BULK_MAX_ITEMS:
+            return Response(
+                {'detail': f'At most {settings.POST_BULK_MAX_ITEMS} posts can be created at once.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = [None] * len(request.data)
+        pending = []
+        for index, item in enumerate(request.data):
+            try:
+                data = serializer.child.run_validation(item)
+            except ValidationError as exc:
+                results[index] = {'index': index, 'status': status.HTTP_400_BAD_REQUEST, 'errors': exc.detail}
+            else:
+                pending.append((index, Post(author=request.user, **data)))
+
+        created = []
+        batch_size = settings.POST_BULK_BATCH_SIZE
+        with transaction.atomic():
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                try:
+                    # A savepoint per batch so one failed batch keeps the others
+                    with transaction.atomic():
+                        Post.objects.bulk_create([post for _, post in batch])
+                except DatabaseError:
+                    for index, _ in batch:
+                        results[index] = {
+                            'index': index,
+                            'status': status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            'errors': {'non_field_errors': ['The post could not be saved.']},
+                        }
+                    continue
+                for index, post in batch:
+                    results[index] = {
+                        'index': index, 'status': status.HTTP_201_CREATED, 'id': post.pk, 'created_at': post.created_at,
+                    }
+                    created.append(post)
+
+            if created:
+                timeline.fan_out_posts(created)
+                # bulk_create sends no post_save, so expire cached responses here
+                response_cache.expire()
+
+        if len(created) == len(results):
+            code = status.HTTP_201_CREATED
+        elif created:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        return Response({'results': results}, status=code)
+
+    @action(detail=True, methods=['get'])
+    def comments(self, request, pk=None):
+        """
+        GET /api/posts/{id}/comments/
+        - The full comment thread of a post, newest first, cursor paginated.
+        """
+        post = generics.get_object_or_404(Post.objects.visible().only('pk'), pk=pk)
+        comments = Comment.objects.filter(post=post).select_related('author')
+        page = self.paginate_queryset(comments)
+        serializer = CommentSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """
+        GET /api/posts/trending/?limit=N
+        - Posts with the most recent like/comment activity, best first, read
+          from the cached top-K list (see posts.trending).
+        """
+        limit = settings.TRENDING_TOP_K
+        if 'limit' in request.query_params:
+            try:
+                limit = min(int(request.query_params['limit']), limit)
+            except ValueError:
+                pass
+        post_ids = [post_id for post_id, _ in trending.top()[:max(limit, 0)]]
+        posts = Post.objects.visible().select_related('author').with_comment_preview().in_bulk(post_ids)
+        serializer = self.get_serializer([posts[pk] for pk in post_ids if pk in posts], many=True)
+        return Response(serializer.data)
 
 class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all().order_by('-created_at')
+    queryset = Comment.objects.select_related('author').order_by('-created_at', '-id')
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
 
+    # Keep Post.comment_count in step with every comment write
+
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        comment = serializer.save(author=self.request.user)
+        Post.objects.filter(pk=comment.post_id).update(comment_count=F('comment_count') + 1)
+        trending.record(comment.post_id, 'comment')
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old_post_id = serializer.instance.post_id
+        comment = serializer.save()
+        if comment.post_id != old_post_id:
+            Post.objects.filter(pk=old_post_id, comment_count__gt=0).update(comment_count=F('comment_count') - 1)
+            Post.objects.filter(pk=comment.post_id).update(comment_count=F('comment_count') + 1)
+            trending.record(old_post_id, 'comment', undo=True, at=comment.created_at)
+            trending.record(comment.post_id, 'comment', at=comment.created_at)
+            # post_save only expires the post the comment moved to
+            response_cache.expire(old_post_id)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        post_id = instance.post_id
+        instance.delete()
+        Post.objects.filter(pk=post_id, comment_count__gt=0).update(comment_count=F('comment_count') - 1)
+        trending.record(post_id, 'comment', undo=True, at=instance.created_at)
+
+class FeedPagination(KeysetPagination):
+    # Annotated by timeline.feed_queryset: the timeline entry's keyset when
+    # the feed is read from the timeline alone
+    ordering = ('-feed_at', '-feed_id')
 
 class FeedView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = PostSerializer
+    pagination_class = FeedPagination
 
     def get_queryset(self):
-        user = self.request.user
-        following_users = user.following.all()
-        
-        return Post.objects.filter(author__in=following_users).order_by('-created_at')
+        # Read the precomputed timeline instead of scanning every followed author
+        return timeline.feed_queryset(self.request.user).with_comment_preview().order_by(*FeedPagination.ordering)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        # Validate the page from its post versions before rendering it
+        etag = etags.page_etag(request, self.paginator, queryset, self)
+        response = etags.not_modified(request, etag)
+        if response is None:
+            page = self.paginate_queryset(queryset)
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+        return etags.tag(response, etag)
 
 class LikePostView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -40,22 +200,19 @@ class LikePostView(generics.GenericAPIView):
 
     def post(self, request, pk):
         # Use generics.get_object_or_404 logic
-        post = generics.get_object_or_404(Post, pk=pk)
+        post = generics.get_object_or_404(Post.objects.visible(), pk=pk)
         
         # Check if user already liked the post
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
+        with transaction.atomic():
+            like, created = Like.objects.get_or_create(user=request.user, post=post)
+            if created:
+                Post.objects.filter(pk=post.pk).update(like_count=F('like_count') + 1)
+                trending.record(post.pk, 'like')
+                # Queue the notification; process_notifications delivers and coalesces it
+                outbox.enqueue(post.author_id, request.user.pk, 'liked your post', post)
 
         if not created:
             return Response({'detail': 'User already liked this post'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Create Notification
-        if created:
-            Notification.objects.create(
-                recipient=post.author,
-                actor=request.user,
-                verb='liked your post',
-                target=post
-            )
 
         return Response({'detail': 'Post liked'}, status=status.HTTP_200_OK)
 
@@ -64,11 +221,17 @@ class UnlikePostView(generics.GenericAPIView):
     queryset = Like.objects.all()
 
     def post(self, request, pk):
-        post = generics.get_object_or_404(Post, pk=pk)
+        post = generics.get_object_or_404(Post.objects.visible(), pk=pk)
         
-        try:
-            like = Like.objects.get(user=request.user, post=post)
-            like.delete()
+        with transaction.atomic():
+            like = Like.objects.filter(user=request.user, post=post).first()
+            deleted = like is not None and like.delete()[0]
+            if deleted:
+                Post.objects.filter(pk=post.pk, like_count__gt=0).update(like_count=F('like_count') - 1)
+                trending.record(post.pk, 'like', undo=True, at=like.created_at)
+                # Retract the user from the (still unread) like notification
+                outbox.enqueue(post.author_id, request.user.pk, 'liked your post', post, undo=True)
+
+        if deleted:
             return Response({'detail': 'Post unliked'}, status=status.HTTP_200_OK)
-        except Like.DoesNotExist:
-            return Response({'detail': 'You have not liked this post'}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response({'detail': 'You have not liked this post'}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""
+Per-request SQL instrumentation for development.
+
+QueryTimingMiddleware wraps every database connection for the duration of a
+request and records the number of queries, their total time and the slowest
+QUERY_TIMING_SLOWEST statements. In DEBUG mode the numbers are sent back in a
+`Server-Timing` header, which browser dev tools show next to the request:
+
+    Server-Timing: db;dur=4.21;desc="3 queries", sql-1;dur=2.03;desc="SELECT ..."
+
+The same numbers are attached to the request as `request.query_stats`.
+Queries run while a streaming response is consumed happen after the
+middleware returns and are not counted.
+
+The middleware runs natively in both sync and async chains, so enabling it
+never forces async views through an extra thread hop. Under ASGI the ORM
+runs on the request's sync_to_async thread, so the wrappers are installed on
+that thread's connections.
+"""
+import heapq
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+# Longest SQL text shown in a Server-Timing description
+DESCRIPTION_LENGTH = 120
+
+
+class QueryStats:
+    """An execute_wrapper that tallies every query it sees."""
+
+    def __init__(self, keep=3):
+        self.count = 0
+        self.duration = 0.0
+        self.keep = keep
+        self.slowest = []  # min-heap of (seconds, sequence, sql)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            entry = (elapsed, self.count, sql)
+            if len(self.slowest) < self.keep:
+                heapq.heappush(self.slowest, entry)
+            else:
+                heapq.heappushpop(self.slowest, entry)
+
+    def server_timing(self):
+        metrics = [f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries"']
+        for rank, (elapsed, _, sql) in enumerate(sorted(self.slowest, reverse=True), start=1):
+            metrics.append(f'sql-{rank};dur={elapsed * 1000:.2f};desc="{_describe(sql)}"')
+        return ', '.join(metrics)
+
+
+def _describe(sql):
+    text = ' '.join(sql.split())
+    if len(text) > DESCRIPTION_LENGTH:
+        text = text[:DESCRIPTION_LENGTH - 3] + '...'
+    return text.replace('\\', '\\\\').replace('"', '\\"')
+
+
+class QueryTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = QueryStats(settings.QUERY_TIMING_SLOWEST)
+        request.query_stats = stats
+        with ExitStack() as stack:
+            _wrap_connections(stack, stats)
+            response = self.get_response(request)
+        response['Server-Timing'] = stats.server_timing()
+        return response
+
+    async def __acall__(self, request):
+        stats = QueryStats(settings.QUERY_TIMING_SLOWEST)
+        request.query_stats = stats
+        with ExitStack() as stack:
+            await sync_to_async(_wrap_connections)(stack, stats)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        response['Server-Timing'] = stats.server_timing()
+        return response
+
+
+def _wrap_connections(stack, stats):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(stats))
@@ -0,0 +1,218 @@
+"""
+Keyset (cursor) pagination shared by every list endpoint.
+
+DRF's CursorPagination keys on a single field and falls back to an OFFSET for
+rows that share it. Here the cursor carries the full sort key of the last row
+seen, e.g. (created_at, id), and the next page is fetched with
+
+    WHERE created_at <= :created_at
+      AND (created_at < :created_at OR (created_at = :created_at AND id < :id))
+
+so every page is an index range scan of `page_size + 1` rows, however deep it
+is, and no COUNT(*) is ever issued.
+"""
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from datetime import date, datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(pagination.BasePagination):
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    # Sort key of the paginated rows, most significant field first. The last
+    # field must be unique so that every row has a distinct position.
+    ordering = ('-created_at', '-id')
+
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        reverse, position = self.get_page_bounds(queryset, request, view)
+        results = list(self._window(queryset, reverse, position))
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        # Walking backwards, "more" rows lie before the page; walking forwards
+        # they lie after it. Either way, arriving via a cursor means the rows
+        # we came from exist on the other side.
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = has_more if reverse else position is not None
+        self.page = results
+        return results
+
+    def get_page_bounds(self, queryset, request, view=None):
+        """Resolve page size, ordering and cursor; return (reverse, position)."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        cursor = self.decode_cursor(request)
+        if not cursor:
+            return False, None
+        reverse, position = cursor
+        return reverse, self.coerce_position(queryset, position)
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """
+        The `page_size + 1` rows of the requested page, in query order.
+        Callers can narrow it with `.values()` to inspect a page cheaply
+        without loading or serializing full objects.
+        """
+        reverse, position = self.get_page_bounds(queryset, request, view)
+        return self._window(queryset, reverse, position)
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return pagination._positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size,
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        # Filter backends that re-rank rows (full-text search) supply their
+        # own keyset through `get_keyset_ordering`
+        for backend_class in getattr(view, 'filter_backends', ()):
+            backend = backend_class()
+            if hasattr(backend, 'get_keyset_ordering'):
+                ordering = backend.get_keyset_ordering(request, queryset, view)
+                if ordering:
+                    return ordering
+        return self.ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(False, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(True, self.page[0])
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    # Cursor encoding
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            payload = json.loads(b64decode(encoded.encode('ascii'), altchars=b'-_'))
+            reverse = bool(payload['r'])
+            position = list(payload['p'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, position
+
+    def coerce_position(self, queryset, position):
+        """
+        Convert the decoded cursor values to the Python types of the ordering
+        fields, so a tampered cursor is rejected here rather than failing
+        inside the query.
+        """
+        values = []
+        try:
+            for field, value in zip(self.ordering, position):
+                if value is None:
+                    raise ValueError(field)
+                values.append(self._field(queryset, field.lstrip('-')).to_python(value))
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def encode_cursor(self, reverse, item):
+        position = [self._key_value(item, field) for field in self.ordering]
+        payload = json.dumps({'r': int(reverse), 'p': position}, separators=(',', ':'))
+        encoded = b64encode(payload.encode('utf-8'), altchars=b'-_').decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    # Helpers
+
+    def _window(self, queryset, reverse, position):
+        order = [self._flip(field) for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*order)
+        if position is not None:
+            queryset = queryset.filter(self._after(order, position))
+        return queryset[:self.page_size + 1]
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    @staticmethod
+    def _after(order, position):
+        """
+        Build the row-value comparison `(f1, f2, ...) > (v1, v2, ...)` for
+        `order`. The redundant leading bound `f1 >= v1` lets the database
+        start its index range at the cursor instead of scanning from the
+        first row and filtering.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(order, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        first, value = order[0], position[0]
+        bound = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{bound}': value}) & condition
+
+    @staticmethod
+    def _field(queryset, name):
+        """The model field or annotation output field that `name` orders by."""
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        if name == 'pk':
+            return queryset.model._meta.pk
+        try:
+            return queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise ValueError(name)
+
+    @staticmethod
+    def _key_value(item, field):
+        name = field.lstrip('-')
+        value = item[name] if isinstance(item, dict) else getattr(item, name)
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return value
@@ -46,7 +46,21 @@ INSTALLED_APPS = [
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'accounts.authentication.CachedTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+    # Keyset pagination on (created_at, id): deep pages cost the same as the
+    # first one and no endpoint issues a COUNT(*).
+    'DEFAULT_PAGINATION_CLASS': 'social_media_api.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+}
+
 MIDDLEWARE = [
+    # Outermost so it sees the queries of every other middleware (DEBUG only)
+    'social_media_api.middleware.QueryTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -87,6 +101,18 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Use a shared backend (Redis/Memcached) in production so cached counters and
+# invalidations are seen by every worker process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -123,7 +149,189 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# User uploads (profile pictures and their rendered variants)
+
+MEDIA_URL = 'media/'
+
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Number of most recent comments embedded in each serialized post. The full
+# thread is paged through /api/posts/{id}/comments/.
+
+POST_COMMENT_PREVIEW_SIZE = 3
+
+
+# Feed timelines
+# Posts are fanned out into each follower's TimelineEntry rows when they are
+# created. Authors with more followers than TIMELINE_FANOUT_THRESHOLD are
+# skipped on write and merged into the feed at read time instead.
+
+TIMELINE_FANOUT_THRESHOLD = 5000
+
+TIMELINE_BATCH_SIZE = 1000
+
+# Bulk post creation (POST /api/posts/bulk/): items per request, and rows per
+# INSERT statement.
+
+POST_BULK_MAX_ITEMS = 1000
+
+POST_BULK_BATCH_SIZE = 100
+
+
+# Token authentication cache (accounts.authentication)
+# Token -> user ID lookups, and the fields request.user is built from, are
+# cached in the shared cache for TOKEN_CACHE_TTL seconds. Token lookups are
+# also kept in a per-process LRU of TOKEN_CACHE_LOCAL_MAX_ENTRIES entries for
+# TOKEN_CACHE_LOCAL_TTL seconds.
+
+TOKEN_CACHE_TTL = 5 * 60
+
+TOKEN_CACHE_LOCAL_TTL = 30
+
+TOKEN_CACHE_LOCAL_MAX_ENTRIES = 10000
+
+
+# Password hashing pool (accounts.hashing)
+# The async register/login endpoints hash on PASSWORD_HASHING_WORKERS threads
+# with at most PASSWORD_HASHING_QUEUE_SIZE requests waiting; beyond that they
+# answer 503 with Retry-After: PASSWORD_HASHING_RETRY_AFTER seconds.
+
+PASSWORD_HASHING_WORKERS = 4
+
+PASSWORD_HASHING_QUEUE_SIZE = 16
+
+PASSWORD_HASHING_RETRY_AFTER = 1
+
+
+# Follow graph index (accounts.graph)
+# Sorted follower/following ID arrays are cached in the shared cache for
+# FOLLOW_GRAPH_CACHE_TTL seconds and in a per-process LRU of
+# FOLLOW_GRAPH_LOCAL_MAX_ENTRIES entries for FOLLOW_GRAPH_LOCAL_TTL seconds.
+
+FOLLOW_GRAPH_CACHE_TTL = 24 * 60 * 60
+
+FOLLOW_GRAPH_LOCAL_TTL = 30
+
+FOLLOW_GRAPH_LOCAL_MAX_ENTRIES = 10000
+
+# Number of "people you may know" suggestions kept per user by
+# compute_follow_suggestions.
+
+FOLLOW_SUGGESTIONS_TOP_K = 20
+
+
+# Notifications
+# Events for the same recipient, verb and target are merged into the newest
+# unread notification if it is younger than this many seconds.
+
+NOTIFICATION_COALESCE_WINDOW = 60 * 60
+
+# Seconds a user's cached unread-notification count is kept before it is
+# recomputed.
+
+NOTIFICATION_UNREAD_COUNT_TTL = 60 * 60
+
+# Days to keep notifications once they have been read, per verb. 'default'
+# applies to every other verb; None keeps them forever. Enforced by the
+# prune_notifications command.
+
+NOTIFICATION_RETENTION_DAYS = {
+    'default': 90,
+    'liked your post': 30,
+}
+
+# Notification event stream (notifications.views.notification_stream)
+# Open streams check the cache-backed log in notifications.broker for
+# published notifications every NOTIFICATION_STREAM_POLL_INTERVAL seconds, and
+# send a heartbeat comment every NOTIFICATION_STREAM_HEARTBEAT seconds. Streams
+# are served under ASGI only. The log must live in a cache shared
+# with the process_notifications worker; entries are kept for
+# NOTIFICATION_STREAM_LOG_TTL seconds. A user may hold up to
+# NOTIFICATION_STREAM_MAX_CONNECTIONS streams per process; opening another
+# closes their oldest. Each stream buffers up to NOTIFICATION_STREAM_QUEUE_SIZE
+# wake-ups, and a stream further behind than that in the log reloads its newest
+# rows instead. Stream tickets are valid for NOTIFICATION_STREAM_TICKET_TTL
+# seconds.
+
+NOTIFICATION_STREAM_HEARTBEAT = 15
+
+NOTIFICATION_STREAM_POLL_INTERVAL = 1
+
+NOTIFICATION_STREAM_LOG_TTL = 5 * 60
+
+NOTIFICATION_STREAM_MAX_CONNECTIONS = 5
+
+NOTIFICATION_STREAM_QUEUE_SIZE = 100
+
+NOTIFICATION_STREAM_TICKET_TTL = 30
+
+
+# Trending posts (posts.trending)
+# Each like or comment adds its weight to the post's score, which halves every
+# TRENDING_HALF_LIFE seconds. Posts with no activity for TRENDING_WINDOW
+# seconds drop out. The top TRENDING_TOP_K posts are cached and recomputed at
+# most every TRENDING_REFRESH_INTERVAL seconds.
+
+TRENDING_HALF_LIFE = 6 * 60 * 60
+
+TRENDING_WINDOW = 48 * 60 * 60
+
+TRENDING_TOP_K = 100
+
+TRENDING_REFRESH_INTERVAL = 60
+
+TRENDING_WEIGHTS = {
+    'like': 1.0,
+    'comment': 2.0,
+}
+
+
+# Anonymous post response cache (posts.response_cache)
+# Responses live for RESPONSE_CACHE_TTL seconds and are invalidated early by
+# any Post/Comment/Like write. While one request rebuilds a stale entry,
+# others may keep serving it if it is younger than RESPONSE_CACHE_STALE_TTL,
+# or wait up to RESPONSE_CACHE_LOCK_TIMEOUT seconds for the rebuild.
+
+RESPONSE_CACHE_TTL = 5 * 60
+
+RESPONSE_CACHE_STALE_TTL = 30
+
+RESPONSE_CACHE_LOCK_TIMEOUT = 5
+
+
+# Profile picture variants (accounts.thumbnails)
+# Square JPEG renditions, keyed by name with their edge length in pixels,
+# rendered by the process_thumbnails worker after each upload. Failed jobs are
+# retried with exponential backoff up to THUMBNAIL_JOB_MAX_ATTEMPTS times; a
+# worker holds a job for THUMBNAIL_JOB_LEASE seconds before another may take it.
+
+PROFILE_PICTURE_VARIANTS = {
+    'small': 64,
+    'medium': 160,
+    'large': 480,
+}
+
+PROFILE_PICTURE_QUALITY = 82
+
+THUMBNAIL_JOB_MAX_ATTEMPTS = 5
+
+THUMBNAIL_JOB_LEASE = 5 * 60
+
+
+# Account data export (accounts.export)
+# Rows read per query while streaming an account's NDJSON export.
+
+ACCOUNT_EXPORT_CHUNK_SIZE = 1000
+
+
+# SQL instrumentation (social_media_api.middleware)
+# In DEBUG mode every response carries a Server-Timing header with the query
+# count, total SQL time and the QUERY_TIMING_SLOWEST slowest statements.
+
+QUERY_TIMING_SLOWEST = 3
@@ -14,6 +14,8 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
@@ -23,4 +25,7 @@ urlpatterns = [
     path('api/', include('posts.urls')),
     path('api/', include('posts.urls')),
     path('api/notifications/', include('notifications.urls')),
-]
\ No newline at end of file
+]
+
+# Serve uploads from the development server; production serves MEDIA_ROOT directly
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)